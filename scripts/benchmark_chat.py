@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from src.utils.jsonl import load_messages
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("benchmark_chat")
+
+def summarize(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"count": len(values), "p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(max(values))}
+
+def use_fakeredis(main):
+    """Troca os clientes Redis do app por um fakeredis em memória."""
+    try:
+        import fakeredis
+        import fakeredis.aioredis
+    except ImportError:
+        raise RuntimeError("--redis fakeredis requer o pacote 'fakeredis' instalado")
+
+    server = fakeredis.FakeServer()
+    main.services.redis.client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    main.services.redis.async_client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    main.services.response_cache.client = main.services.redis.async_client
+
+async def run(args) -> dict:
+    # NOTE: as Settings são lidas no import, então o ambiente precisa estar pronto antes
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ["FAKE_LLM_TOKEN_DELAY_MS"] = str(args.token_delay_ms)
+    if args.no_cache:
+        os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+
+    import httpx
+    from src.api import main
+    from src.utils.metrics import metrics
+
+    if args.redis == "fakeredis":
+        use_fakeredis(main)
+
+    messages = load_messages(args.input, args.field)
+    if not messages:
+        raise ValueError(f"Nenhuma mensagem encontrada em {args.input}")
+
+    endpoint = "/chat/stream" if args.stream else "/chat"
+    latencies = []
+    errors = 0
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+
+        async def send(i: int):
+            nonlocal errors
+            payload = {"message": messages[i % len(messages)], "user_id": f"bench_{i % args.users}"}
+            start = time.perf_counter()
+            response = await client.post(endpoint, json=payload)
+            if response.status_code != 200:
+                errors += 1
+                return
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        await send(0) # NOTE: warm-up (load do modelo) fora da medição
+        metrics.reset()
+
+        start = time.perf_counter()
+        if args.rate:
+            # NOTE: open-loop, chegadas de Poisson independentes do tempo de resposta
+            tasks = []
+            for i in range(args.requests):
+                await asyncio.sleep(random.expovariate(args.rate))
+                tasks.append(asyncio.create_task(send(i)))
+            await asyncio.gather(*tasks)
+        else:
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def bounded(i: int):
+                async with semaphore:
+                    await send(i)
+
+            await asyncio.gather(*(bounded(i) for i in range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+    stages = {name: data for name, data in metrics.snapshot().items() if name.startswith("chat.")}
+    return {
+        "endpoint": endpoint,
+        "mode": f"open-loop {args.rate}/s" if args.rate else f"closed-loop concurrency={args.concurrency}",
+        "requests": args.requests,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": summarize(latencies),
+        "stages_ms": stages,
+        "inference": main.services.intent.stats(),
+    }
+
+def print_report(report: dict):
+    print(f"\n{report['endpoint']} | {report['mode']} | {report['requests']} requisições, {report['errors']} erros")
+    print(f"Throughput: {report['throughput_rps']:.1f} req/s em {report['elapsed_s']:.2f}s")
+
+    latency = report["latency_ms"]
+    if latency["count"]:
+        print(f"{'total':<16} p50 {latency['p50']:8.2f}  p95 {latency['p95']:8.2f}  p99 {latency['p99']:8.2f} ms")
+
+    for name, data in report["stages_ms"].items():
+        if "p50" in data:
+            label = name.replace("chat.", "").replace("_ms", "")
+            print(f"{label:<16} p50 {data['p50']:8.2f}  p95 {data['p95']:8.2f}  p99 {data['p99']:8.2f} ms  (n={data['count']})")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay de tráfego JSONL contra o orquestrador (src.api.main:app) com LLM simulado."
+    )
+    parser.add_argument("-i", "--input", default="requests.jsonl", help="Arquivo JSONL com as mensagens")
+    parser.add_argument("--field", default="message", help="Campo do JSONL com o texto da mensagem")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="Total de requisições (o arquivo é repetido)")
+    parser.add_argument("-c", "--concurrency", type=int, default=16, help="Requisições simultâneas (closed-loop)")
+    parser.add_argument("-r", "--rate", type=float, default=None, help="Chegadas por segundo (open-loop, Poisson)")
+    parser.add_argument("--users", type=int, default=50, help="Quantidade de user_ids distintos")
+    parser.add_argument("--stream", action="store_true", help="Usa o /chat/stream em vez do /chat")
+    parser.add_argument("--llm-latency-ms", type=float, default=300, help="Latência simulada até o primeiro token")
+    parser.add_argument("--token-delay-ms", type=float, default=5, help="Intervalo simulado entre tokens")
+    parser.add_argument("--redis", choices=["fakeredis", "local"], default="fakeredis", help="Backend Redis (local usa REDIS_CACHE_HOST/PORT)")
+    parser.add_argument("--no-cache", action="store_true", help="Desativa o cache de respostas")
+    parser.add_argument("-o", "--output", default=None, help="Salva o relatório em JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
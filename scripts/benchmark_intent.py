@@ -0,0 +1,100 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.getcwd())
+
+from src.services.intent_service import IntentService, HYPOTHESIS_TEMPLATE
+from src.utils.config import settings
+from src.utils.jsonl import load_messages
+
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("benchmark_intent")
+
+
+def measure(func, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    p50, p95 = np.percentile(timings, [50, 95])
+    return {"p50_ms": float(p50), "p95_ms": float(p95)}
+
+def bench_tokenization(service: IntentService, messages: list[str], labels: list[str], repeat: int) -> dict:
+    """Compara o encode_batch completo com a emenda sobre as hipóteses em cache."""
+    label_set = service._label_sets.get(tuple(labels))
+
+    def full():
+        for text in messages:
+            service.tokenizer.encode_batch([(text, HYPOTHESIS_TEMPLATE.format(label)) for label in labels])
+
+    def cached():
+        for text in messages:
+            service._splice(text, label_set)
+
+    results = {"encode_batch": measure(full, repeat)}
+    if label_set:
+        results["cached_hypotheses"] = measure(cached, repeat)
+    for result in results.values():
+        result["per_message_us"] = result["p50_ms"] * 1000 / len(messages)
+    return results
+
+def bench_batch_sizes(service: IntentService, messages: list[str], labels: list[str], sizes: list[int], repeat: int) -> dict:
+    """Latência de um _run_batch com N mensagens (N * len(labels) pares)."""
+    results = {}
+    for size in sizes:
+        batch = [service._encode(messages[i % len(messages)], labels) for i in range(size)]
+        result = measure(lambda: service._run_batch(batch), repeat)
+        result["messages_per_s"] = size / (result["p50_ms"] / 1000)
+        results[size] = result
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Microbenchmarks do IntentService: tokenização e tamanho de batch do session.run."
+    )
+    parser.add_argument("-i", "--input", default="data/eval/intent_eval.jsonl", help="JSONL com as mensagens")
+    parser.add_argument("--field", default="text", help="Campo do JSONL com o texto da mensagem")
+    parser.add_argument("--sizes", default="1,2,4,8,16,32", help="Tamanhos de batch (mensagens por session.run)")
+    parser.add_argument("--repeat", type=int, default=20, help="Repetições por medição")
+    parser.add_argument("-o", "--output", default=None, help="Salva o relatório em JSON")
+    args = parser.parse_args()
+
+    messages = load_messages(args.input, args.field)
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    service = IntentService(batching=False)
+    service.register_labels(settings.POSSIBLE_INTENTS)
+    service.predict_intent(messages[0], settings.POSSIBLE_INTENTS) # NOTE: warm-up
+
+    report = {
+        "session_profile": service.session_profile,
+        "model_variant": service.model_variant,
+        "tokenization": bench_tokenization(service, messages, settings.POSSIBLE_INTENTS, args.repeat),
+        "batch_sizes": bench_batch_sizes(service, messages, settings.POSSIBLE_INTENTS, sizes, args.repeat),
+    }
+
+    print(f"\nPerfil {report['session_profile']} | variante {report['model_variant']}")
+    for name, result in report["tokenization"].items():
+        print(f"tokenização {name:<18} {result['per_message_us']:8.1f} us/mensagem")
+    for size, result in report["batch_sizes"].items():
+        print(
+            f"batch {size:>3} mensagens  p50 {result['p50_ms']:8.2f} ms  "
+            f"p95 {result['p95_ms']:8.2f} ms  {result['messages_per_s']:8.1f} msg/s"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,11 @@ import argparse
 import logging
 import sys
 import os
+import time
 
 sys.path.append(os.getcwd())
 
-from src.services.model_builder import ModelBuilder
+from src.services.model_builder import ModelBuilder, build_all, load_build_manifest
 
 logging.basicConfig(
     level=logging.INFO,
@@ -13,6 +14,22 @@ logging.basicConfig(
 )
 logger = logging.getLogger("cli_builder")
 
+def run_manifest(args):
+    entries = load_build_manifest(args.manifest)
+    logger.info(f"Buildando {len(entries)} modelos de {args.manifest}...")
+
+    start = time.perf_counter()
+    results = build_all(entries, workers=args.jobs, force=args.force)
+    elapsed = time.perf_counter() - start
+
+    for result in sorted(results, key=lambda r: r["name"]):
+        status = "pulado" if result["skipped"] else ("ok" if result["ok"] else "FALHOU")
+        logger.info(f"{result['name']:<40} {status:<8} {result['version'] or '-'}")
+    logger.info(f"Total: {elapsed:.1f}s")
+
+    if not all(result["ok"] for result in results):
+        sys.exit(1)
+
 def main():
     parser = argparse.ArgumentParser(
         description="CLI para baixar modelos do HuggingFace, converter/empacotar e salvar no Storage Local."
@@ -20,18 +37,54 @@ def main():
 
     parser.add_argument(
         "-m", "--model", 
-        required=True, 
         help="ID do modelo no HuggingFace (ex: Xenova/nli-deberta-v3-xsmall)"
     )
 
     parser.add_argument(
         "-n", "--name", 
-        required=True, 
         help="Nome do arquivo de saída .zip (ex: intent_classifier_v1.zip)"
     )
 
+    parser.add_argument(
+        "--manifest",
+        default=None,
+        help="JSON com a lista de modelos ({\"model\", \"name\", \"quantize\"?}) para buildar em paralelo"
+    )
+
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=None,
+        help="Builds simultâneos com --manifest (padrão: número de CPUs)"
+    )
+
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuilda mesmo se as entradas não mudaram desde a última publicação"
+    )
+
+    parser.add_argument(
+        "-q", "--quantize",
+        action="store_true",
+        help="Gera também a variante INT8 (quantização dinâmica) e o relatório de comparação"
+    )
+
+    parser.add_argument(
+        "--eval-set",
+        default=None,
+        help="JSONL com {\"text\", \"intent\"} usado no relatório de quantização"
+    )
+
     args = parser.parse_args()
 
+    if args.manifest:
+        run_manifest(args)
+        return
+
+    if not args.model or not args.name:
+        parser.error("informe -m/--model e -n/--name, ou --manifest")
+
     logger.info(f"Iniciando build...")
     logger.info(f"Modelo: {args.model}")
     logger.info(f"Artefato: {args.name}")
@@ -39,9 +92,12 @@ def main():
     try:
         builder = ModelBuilder(
             model_id=args.model,
-            artifact_name=args.name
+            artifact_name=args.name,
+            quantize=args.quantize,
+            eval_set=args.eval_set
         )
-        builder.run()
+        if not builder.run(force=args.force):
+            raise RuntimeError("ModelBuilder.run() retornou falha")
         logger.info("Processo finalizado com sucesso!")
         
     except Exception as e:
@@ -0,0 +1,124 @@
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.append(os.getcwd())
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("check_llm_resilience")
+
+RESET_S = 0.3
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_mock(port: int):
+    """Sobe o mock do Gemini numa thread deste processo (o comportamento muda via app.state)."""
+    import uvicorn
+    from src.services.mock_gemini import create_app
+
+    app = create_app(latency_ms=10, slow_rate=0.0, slow_ms=0, error_rate=0.0, token_delay_ms=1)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return app
+
+def open_circuit(app, llm):
+    """Abre o circuito com 503 e espera o reset_timeout: a próxima chamada é a de teste (meio-aberto)."""
+    app.state.error_rate, app.state.error_status = 1.0, 503
+    while llm.breaker.state != "open":
+        llm.generate_response("oi")
+    time.sleep(RESET_S)
+
+def check(name: str, llm, expected_state: str):
+    breaker = llm.breaker
+    ok = breaker.state == expected_state and not breaker._probing
+    logger.info(f"{'OK  ' if ok else 'FALHA'} {name}: estado {breaker.state}, sonda pendente {breaker._probing}")
+    return ok
+
+async def cancel_probe(llm, stream: bool):
+    async def consume():
+        if stream:
+            async for _ in llm.stream_response_async("oi"):
+                pass
+        else:
+            await llm.generate_response_async("oi")
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0.2)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+async def run_checks(app, llm) -> list[bool]:
+    # NOTE: um único event loop; o cliente httpx assíncrono do google-genai fica preso ao loop em que foi usado
+    results = []
+
+    # 400 na chamada de teste: o upstream respondeu, o circuito fecha
+    open_circuit(app, llm)
+    app.state.error_status = 400
+    await llm.generate_response_async("oi")
+    results.append(check("400 no meio-aberto (async)", llm, "closed"))
+
+    open_circuit(app, llm)
+    app.state.error_status = 400
+    llm.generate_response("oi")
+    results.append(check("400 no meio-aberto (sync)", llm, "closed"))
+
+    # Cancelamento da chamada de teste: continua meio-aberto, mas libera a próxima sonda
+    for stream in (False, True):
+        open_circuit(app, llm)
+        app.state.error_rate, app.state.latency_ms = 0.0, 2000
+        await cancel_probe(llm, stream)
+        results.append(check(f"cancelamento no meio-aberto ({'stream' if stream else 'async'})", llm, "half_open"))
+
+    # Depois de tudo, uma chamada normal fecha o circuito
+    app.state.error_rate, app.state.latency_ms = 0.0, 10
+    await llm.generate_response_async("oi")
+    results.append(check("recuperação", llm, "closed"))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Verifica que a chamada de teste do circuit breaker (meio-aberto) sempre termina registrada: "
+                    "erro 400, cancelamento e resposta normal, contra o scripts/mock_gemini.py."
+    )
+    parser.parse_args()
+
+    port = free_port()
+    # NOTE: antes de importar src.*, porque as Settings são lidas no import
+    os.environ.update({
+        "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY", "mock"),
+        "GEMINI_BASE_URL": f"http://127.0.0.1:{port}",
+        "LLM_BREAKER_FAILURES": "1",
+        "LLM_BREAKER_RESET_S": str(RESET_S),
+        "LLM_MAX_RETRIES": "0",
+        "LLM_TIMEOUT_S": "5",
+        "LLM_HEDGE_ENABLED": "false",
+    })
+    from src.services.llm_service import LLMService
+
+    app = start_mock(port)
+    llm = LLMService()
+    results = asyncio.run(run_checks(app, llm))
+
+    if not all(results):
+        logger.error(f"{results.count(False)} verificações falharam.")
+        sys.exit(1)
+    logger.info("Circuit breaker OK.")
+
+if __name__ == "__main__":
+    main()
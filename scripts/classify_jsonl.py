@@ -0,0 +1,79 @@
+import argparse
+import logging
+import os
+import resource
+import sys
+import time
+from collections import Counter
+
+sys.path.append(os.getcwd())
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("classify_jsonl")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Classifica a intenção de cada linha de um JSONL em lote (sem LLM), gravando JSONL ou Parquet."
+    )
+    parser.add_argument("input", help="Arquivo JSONL de entrada (ex: requests.jsonl)")
+    parser.add_argument("output", help="Arquivo de saída (.jsonl ou .parquet)")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default=None, help="Padrão: pela extensão da saída")
+    parser.add_argument("--labels", default=None, help="Labels separadas por vírgula (padrão: Settings.POSSIBLE_INTENTS, as mesmas da API)")
+    parser.add_argument("--text-field", default=None, help="Campo com o texto (padrão: message/text/body/title)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Mensagens por tarefa enviada aos workers")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="Workers em paralelo (uma sessão ONNX cada)")
+    parser.add_argument("--max-pending", type=int, default=None, help="Lotes em voo (padrão: 2x workers)")
+    parser.add_argument("--log-every", type=int, default=10000)
+    args = parser.parse_args()
+
+    # NOTE: as Settings são lidas no import; uma sessão single-thread por worker, sem micro-batcher
+    # (os lotes já chegam prontos) e sem o cache de predições (um arquivo grande só o poluiria)
+    os.environ.setdefault("NLU_SESSION_POOL_SIZE", str(args.workers))
+    os.environ.setdefault("NLU_SESSION_PROFILE", "throughput")
+    os.environ.setdefault("NLU_BATCHING_ENABLED", "false")
+    os.environ.setdefault("INTENT_CACHE_ENABLED", "false")
+
+    from src.utils.config import settings
+    from src.services.intent_service import IntentService
+    from src.services.embedding_intent_service import EmbeddingIntentService
+    from src.services.bulk_classifier import read_records, classify_stream, open_writer
+
+    labels = settings.POSSIBLE_INTENTS
+    if args.labels:
+        labels = [label.strip() for label in args.labels.split(",") if label.strip()]
+    service = EmbeddingIntentService() if settings.INTENT_MODE == "embedding" else IntentService()
+    service.warm_up(labels)
+
+    writer = open_writer(args.output, args.format)
+    counts = Counter()
+    start = time.perf_counter()
+    try:
+        rows = classify_stream(
+            service.predict_batch,
+            read_records(args.input, args.text_field),
+            labels,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            max_pending=args.max_pending
+        )
+        for total, row in enumerate(rows, 1):
+            writer.write(row)
+            counts[row["intent"]] += 1
+            if total % args.log_every == 0:
+                logger.info(f"{total} mensagens ({total / (time.perf_counter() - start):.0f}/s)")
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    logger.info(f"{total} mensagens em {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f}/s), pico de memória {peak_mb:.0f}MB")
+    for label, count in counts.most_common():
+        logger.info(f"  {label:<30} {count:>8} ({count / total:.1%})")
+
+if __name__ == "__main__":
+    main()
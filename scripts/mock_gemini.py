@@ -0,0 +1,33 @@
+import argparse
+import logging
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+import uvicorn
+
+from src.services.mock_gemini import create_app
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("mock_gemini")
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor HTTP local que imita a API do Gemini (testes do LLMService).")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=200, help="Latência normal de cada resposta")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fração das requisições com latência de cauda")
+    parser.add_argument("--slow-ms", type=float, default=5000, help="Latência de cauda")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração das requisições que respondem com erro")
+    parser.add_argument("--error-status", type=int, default=503, help="Status HTTP dos erros (ex: 400 para erro não repetível)")
+    parser.add_argument("--token-delay-ms", type=float, default=10, help="Intervalo entre trechos no streaming")
+    args = parser.parse_args()
+
+    app = create_app(args.latency_ms, args.slow_rate, args.slow_ms, args.error_rate, args.token_delay_ms, args.error_status)
+    uvicorn.run(app, host="0.0.0.0", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import gc
+import logging
+import math
+import os
+import signal
+import socket
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(process)d - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("serve")
+
+def cpu_budget() -> int:
+    """Núcleos disponíveis: afinidade do processo, limitada pela quota do cgroup (cpu.max) quando houver."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+def memory_report(pids: list[int]):
+    """Rss/Pss/compartilhado de cada worker (/proc/<pid>/smaps_rollup). Pss << Rss indica páginas compartilhadas."""
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                fields = dict(
+                    (line.split()[0].rstrip(":"), int(line.split()[1])) for line in f if line.split()[-1] == "kB"
+                )
+        except OSError:
+            continue
+        shared = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+        logger.info(
+            f"worker {pid}: rss {fields.get('Rss', 0) / 1024:.0f}MB, pss {fields.get('Pss', 0) / 1024:.0f}MB, "
+            f"compartilhado {shared / 1024:.0f}MB"
+        )
+
+def bind(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def spawn(app, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # NOTE: processo filho; o uvicorn instala os próprios handlers de SIGINT/SIGTERM (shutdown gracioso)
+    import uvicorn
+
+    signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    server = uvicorn.Server(uvicorn.Config(app, access_log=False, log_level="info"))
+    try:
+        server.run(sockets=[sock])
+    finally:
+        os._exit(0)
+
+def supervise(app, sock: socket.socket, workers: int):
+    pids = {spawn(app, sock) for _ in range(workers)}
+    logger.info(f"{workers} workers: {sorted(pids)}")
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, lambda signum, frame: memory_report(sorted(pids)))
+
+    while pids:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        pids.discard(pid)
+        if stopping:
+            continue
+        logger.warning(f"Worker {pid} saiu (status {status}). Subindo outro em 1s...")
+        time.sleep(1)
+        pids.add(spawn(app, sock))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Modo de produção: pré-carrega o modelo uma vez e faz fork de N workers uvicorn "
+                    "que compartilham as páginas do modelo (copy-on-write)."
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Padrão: SERVE_WORKERS ou um por núcleo disponível")
+    parser.add_argument("--backlog", type=int, default=2048)
+    args = parser.parse_args()
+
+    # NOTE: N processos com 1 thread de ONNX Runtime cada, em vez de um processo disputando todos os núcleos.
+    # Definido antes de importar src.*, porque as Settings são lidas no import.
+    os.environ.setdefault("NLU_SESSION_PROFILE", "throughput")
+    os.environ.setdefault("NLU_SESSION_POOL_SIZE", "1")
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+    from src.utils.config import settings
+    from src.services.nlu_engine import SESSION_PROFILES
+    from src.api import main as api
+
+    # NOTE: um NLU_SESSION_PROFILE explícito vence o padrão acima. Um pool de threads do ONNX Runtime
+    # criado no supervisor não sobrevive ao fork, e o session.run dos filhos pode travar esperando por ele.
+    profile = SESSION_PROFILES.get(settings.NLU_SESSION_PROFILE)
+    if profile is None or profile["intra_op_num_threads"] != 1 or profile["inter_op_num_threads"] != 1:
+        logger.error(
+            f"O perfil de sessão {settings.NLU_SESSION_PROFILE!r} usa mais de uma thread do ONNX Runtime, "
+            f"o que não é seguro com fork. Use NLU_SESSION_PROFILE=throughput ou low_memory."
+        )
+        sys.exit(2)
+
+    workers = args.workers or settings.SERVE_WORKERS or cpu_budget()
+    sock = bind(args.host, args.port, args.backlog)
+
+    start = time.perf_counter()
+    api.preload()
+    logger.info(f"Modelo pré-carregado em {(time.perf_counter() - start) * 1000:.0f}ms; fork de {workers} workers")
+
+    # NOTE: o que já existe vai para a geração permanente; a coleta do GC nos filhos não escreve nesses objetos
+    # (escrever no header de cada objeto copiaria as páginas e desfaria o compartilhamento)
+    gc.collect()
+    gc.freeze()
+
+    supervise(api.app, sock, workers)
+    logger.info("Todos os workers encerrados.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+
+sys.path.append(os.getcwd())
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("startup_report")
+
+def import_times(module: str) -> list[tuple[str, float, float]]:
+    """Roda `python -X importtime` num processo limpo e devolve (módulo, self_ms, cumulativo_ms)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env={**os.environ, "PYTHONPATH": os.getcwd()}
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {module}:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    return rows
+
+def report_imports(module: str, top: int):
+    rows = import_times(module)
+    total = next((cumulative for name, _, cumulative in rows if name == module), 0.0)
+    logger.info(f"Import de {module}: {total:.0f}ms")
+
+    # NOTE: só pacotes de topo (sem indentação no importtime), que é onde dá para agir
+    top_level = {}
+    for name, _, cumulative in rows:
+        root = name.split(".")[0]
+        if name == root:
+            top_level[root] = max(top_level.get(root, 0.0), cumulative)
+    for name, cumulative in sorted(top_level.items(), key=lambda item: -item[1])[:top]:
+        logger.info(f"  {name:<40} {cumulative:8.1f}ms")
+
+def report_warm_up():
+    """Cria a app, os serviços e aquece o modelo neste processo, imprimindo as fases do startup."""
+    from src.api import main
+
+    asyncio.run(main.warm_up())
+    print(json.dumps(main.startup_state, indent=2, ensure_ascii=False))
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatório de tempo de startup da API (imports, create_app e warm-up).")
+    parser.add_argument("--module", default="src.api.main", help="Módulo medido com -X importtime")
+    parser.add_argument("--top", type=int, default=15, help="Quantos pacotes mostrar")
+    parser.add_argument("--warm-up", action="store_true", help="Também carrega e aquece o modelo (precisa dos artefatos)")
+    args = parser.parse_args()
+
+    report_imports(args.module, args.top)
+    if args.warm_up:
+        report_warm_up()
+
+if __name__ == "__main__":
+    main()
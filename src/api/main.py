@@ -1,66 +1,336 @@
-from fastapi import FastAPI, HTTPException
+import time
+_import_started = time.perf_counter()
+
+import json
+import asyncio
+import logging
+from functools import cached_property
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 
-from src.services.llm_service import LLMService
+from src.services.llm_service import LLMService, FALLBACK_RESPONSE
+from src.services.fake_llm_service import FakeLLMService
 from src.services.redis_service import RedisService
 from src.services.intent_service import IntentService
+from src.services.embedding_intent_service import EmbeddingIntentService
+from src.services.nlu_engine import NLUEngine, InferenceBusyError, estimate_tokens
+from src.services.model_registry import ModelRegistry
+from src.services.response_cache import ResponseCache
+from src.services.context_builder import ContextBuilder
+from src.utils.config import settings
+from src.utils.metrics import metrics, timed, timed_async
+from src.utils.profiler import sample_stacks, render_collapsed
 from src.utils.telemetry import telemetry
 
-app = FastAPI(title="Compound AI Orchestrator")
-telemetry.instrument_app(app)
+logger = logging.getLogger("api")
+
+# NOTE: estado do warm-up, consultado pelo /health/ready (o load balancer só roteia para réplicas prontas)
+startup_state = {"ready": False, "error": None, "phases_ms": {"imports_ms": (time.perf_counter() - _import_started) * 1000}}
+
+class Services:
+    """
+    Serviços da API criados no primeiro uso (ou no warm-up), não no import do módulo:
+    importar src.api.main não exige chave do Gemini, Redis nem o modelo.
+    O tempo de criação de cada um entra no relatório de startup.
+    """
+    def _timed_init(self, name: str, factory):
+        start = time.perf_counter()
+        service = factory()
+        startup_state["phases_ms"][f"init_{name}_ms"] = (time.perf_counter() - start) * 1000
+        return service
+
+    @cached_property
+    def llm(self):
+        if settings.LLM_BACKEND == "fake":
+            return self._timed_init("llm", FakeLLMService)
+        return self._timed_init("llm", LLMService)
+
+    @cached_property
+    def redis(self) -> RedisService:
+        return self._timed_init("redis", RedisService)
+
+    @cached_property
+    def models(self) -> ModelRegistry:
+        """Modelos de NLU por nome; o engine de intenção é trocado sem restart (hot-swap)."""
+        registry = ModelRegistry()
+        if settings.INTENT_MODE == "embedding":
+            registry.register("intent", EmbeddingIntentService, prepare=lambda engine: engine.warm_up(settings.POSSIBLE_INTENTS))
+        else:
+            embed = self.embed if self.embedder_name else None
+            registry.register("intent", lambda: IntentService(embed=embed), prepare=lambda engine: engine.warm_up(settings.POSSIBLE_INTENTS))
+            if self.embedder_name:
+                registry.register("embedder", lambda: NLUEngine(settings.INTENT_EMBEDDING_ARTIFACT))
+        return registry
+
+    @property
+    def intent(self):
+        """Engine de intenção ativo (carrega se preciso). Dentro de uma requisição, use models.lease."""
+        return self.models.get("intent")
+
+    @property
+    def embedder_name(self):
+        """Modelo que gera embeddings: o próprio engine no modo embedding, o intent_embedder se ativado, ou nenhum."""
+        if settings.INTENT_MODE == "embedding":
+            return "intent"
+        return "embedder" if settings.EMBEDDER_ENABLED else None
+
+    def embed(self, texts: list[str]):
+        if self.embedder_name is None:
+            raise ValueError("Nenhum modelo de embeddings: ative EMBEDDER_ENABLED ou use INTENT_MODE=embedding")
+        with self.models.lease(self.embedder_name) as engine:
+            return engine.embed(texts)
+
+    def count_tokens(self, texts: list[str]) -> list[int]:
+        """Tokenizer do modelo ativo; sem modelo carregado, estima (não força um load no event loop)."""
+        engine = self.models.peek("intent")
+        return engine.count_tokens(texts) if engine else estimate_tokens(texts)
+
+    @cached_property
+    def response_cache(self) -> ResponseCache:
+        # NOTE: a busca semântica precisa de um modelo de embeddings; o NLI só exporta logits
+        if settings.RESPONSE_CACHE_SEMANTIC and self.embedder_name is None:
+            logger.warning("RESPONSE_CACHE_SEMANTIC sem modelo de embeddings (EMBEDDER_ENABLED ou INTENT_MODE=embedding); só a busca exata fica ativa.")
+        return ResponseCache(self.redis.async_client, embed=self.embed if self.embedder_name else None)
+
+    @cached_property
+    def context_builder(self) -> ContextBuilder:
+        return ContextBuilder(self.redis, count_tokens=self.count_tokens, llm_service=self.llm)
+
+services = Services()
+router = APIRouter()
+
+async def warm_up():
+    """Pré-carrega o classificador e aquece as sessões fora do caminho das requisições."""
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    try:
+        start_init = time.perf_counter()
+        intent_service = await loop.run_in_executor(None, services.models.get, "intent")
+        startup_state["phases_ms"]["init_intent_ms"] = (time.perf_counter() - start_init) * 1000
+        startup_state["phases_ms"].update(intent_service.load_timings)
+        startup_state["ready"] = True
+    except Exception as e:
+        startup_state["error"] = str(e)
+        logger.error(f"Warm-up falhou: {e}")
+
+    startup_state["phases_ms"]["total_ms"] = (time.perf_counter() - start) * 1000
+    phases = ", ".join(f"{name} {ms:.0f}ms" for name, ms in startup_state["phases_ms"].items())
+    logger.info(f"Startup: {phases}")
 
-llm_service = LLMService()
-redis_service = RedisService()
-intent_service = IntentService()
+def preload():
+    """
+    Carrega e aquece o modelo no processo atual, sem passar pelo executor nem pelo batcher
+    (nenhuma thread é criada). Usado pelo scripts/serve.py antes do fork: os workers herdam
+    tokenizer e sessões já prontos, compartilhando as páginas por copy-on-write.
+    """
+    start = time.perf_counter()
+    startup_state["phases_ms"].update(services.intent.load_timings)
+    startup_state["phases_ms"]["preload_ms"] = (time.perf_counter() - start) * 1000
+    startup_state["ready"] = True
 
-POSSIBLE_INTENTS = [
-    "saudação", 
-    "falar sobre música", 
-    "dúvida técnica", 
-    "reflexão", 
-    "outros"
-]
+async def watch_models():
+    """Troca (hot-swap) os modelos cujo artefato publicado mudou, a cada NLU_MODEL_WATCH_INTERVAL segundos."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(settings.NLU_MODEL_WATCH_INTERVAL)
+        try:
+            await loop.run_in_executor(None, services.models.check_updates)
+        except Exception as e:
+            logger.error(f"Checagem de versões dos modelos falhou: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.NLU_MODEL_WATCH_INTERVAL > 0:
+        app.state.watch_models_task = asyncio.create_task(watch_models())
+
+    if startup_state["ready"]:
+        logger.info("Modelo pré-carregado pelo supervisor; warm-up dispensado.")
+    elif settings.NLU_WARMUP_ON_STARTUP:
+        # NOTE: em background, para o /health/live responder enquanto o modelo carrega
+        app.state.warm_up_task = asyncio.create_task(warm_up())
+    else:
+        startup_state["ready"] = True
+    yield
 
 class ChatRequest(BaseModel):
     message: str
     user_id: str = "default_user"
 
-@app.post("/chat")
-def chat(payload: ChatRequest):
-    user_msg = payload.message
-    user_id = payload.user_id
+class ClassifyBatchRequest(BaseModel):
+    messages: list[str]
+    labels: list[str] = None
 
+@router.get("/health/live")
+def health_live():
+    """O processo está de pé (não depende do modelo nem do Redis)."""
+    return {"status": "ok"}
+
+@router.get("/health/ready")
+async def health_ready():
+    """Pronto para tráfego: modelo carregado e aquecido e Redis acessível."""
+    redis_ok = True
     try:
-        detected_intent, confidence = intent_service.predict_intent(user_msg, POSSIBLE_INTENTS)
-        history = redis_service.get_context_window(user_id)
+        await asyncio.wait_for(services.redis.async_client.ping(), timeout=1)
+    except Exception:
+        redis_ok = False
 
-        system_instruction = "Você é um assistente útil."
-        
-        if detected_intent == "falar sobre música" and confidence > 0.5:
-            system_instruction += " O usuário quer falar sobre música. Fale com ele sobre o assunto"
-        elif detected_intent == "reflexão":
-            system_instruction += " O usuário parece estar refletindo sobre diversas coisas. Seja um filósofo."
+    ready = startup_state["ready"] and redis_ok
+    body = {
+        "status": "ready" if ready else "starting",
+        "model": startup_state["ready"],
+        "redis": redis_ok,
+        "error": startup_state["error"],
+        "startup_ms": startup_state["phases_ms"],
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+@router.get("/stats/inference")
+def inference_stats():
+    """Profundidade de fila, uso do pool de sessões e padding do classificador (não força o load do modelo)."""
+    engine = services.models.peek("intent")
+    if engine is None:
+        return {"loaded": False}
+    return engine.stats()
+
+@router.get("/stats/cache")
+async def cache_stats():
+    """Acertos, erros e remoções do cache de respostas."""
+    return await services.response_cache.stats()
 
-        context_prompt = f"[Sistema: Intenção detectada: {detected_intent} ({confidence:.2f})]\n{user_msg}"
+@router.get("/metrics")
+def prometheus_metrics():
+    """Histogramas e contadores em processo (tokenização, session.run, batch, padding, Redis, LLM) no formato do Prometheus."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
 
-        ai_response = llm_service.generate_response(
-            prompt=context_prompt, 
-            history=history,
+@router.get("/debug/profile")
+async def debug_profile(seconds: float = 5.0, interval_ms: float = 5.0):
+    """Amostra as pilhas de todas as threads por `seconds` e devolve as pilhas colapsadas (flamegraph)."""
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler desabilitado (PROFILER_ENABLED=false)")
+    seconds = min(max(seconds, 0.1), settings.PROFILER_MAX_SECONDS)
+    result = await asyncio.to_thread(sample_stacks, seconds, max(interval_ms, 1.0) / 1000)
+    logger.info(f"Profile de {seconds:.1f}s: {result['samples']} amostras, {len(result['stacks'])} pilhas")
+    return PlainTextResponse(render_collapsed(result["stacks"]))
+
+@router.post("/classify/batch")
+async def classify_batch(payload: ClassifyBatchRequest):
+    """Classifica várias mensagens de uma vez, sem chamar o LLM nem tocar no histórico."""
+    if len(payload.messages) > settings.CLASSIFY_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo de {settings.CLASSIFY_BATCH_MAX_ITEMS} mensagens por requisição (use scripts/classify_jsonl.py)"
         )
+
+    labels = payload.labels or settings.POSSIBLE_INTENTS
+    if len(labels) > settings.CLASSIFY_MAX_LABELS:
+        raise HTTPException(status_code=413, detail=f"Máximo de {settings.CLASSIFY_MAX_LABELS} labels por requisição")
+    if any(len(label) > settings.CLASSIFY_MAX_LABEL_CHARS for label in labels):
+        raise HTTPException(status_code=413, detail=f"Labels com no máximo {settings.CLASSIFY_MAX_LABEL_CHARS} caracteres")
+    if any(len(message) > settings.CLASSIFY_MAX_MESSAGE_CHARS for message in payload.messages):
+        raise HTTPException(status_code=413, detail=f"Mensagens com no máximo {settings.CLASSIFY_MAX_MESSAGE_CHARS} caracteres")
+
+    loop = asyncio.get_running_loop()
+    try:
+        async with services.models.lease_async("intent") as intent_service:
+            with timed("classify.batch_ms"):
+                results = await loop.run_in_executor(intent_service.executor, intent_service.predict_batch, payload.messages, labels)
+    except InferenceBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return {
+        "labels": labels,
+        "results": [{"intent": label, "confidence": confidence} for label, confidence in results]
+    }
+
+@router.get("/stats/models")
+def model_stats():
+    """Modelos carregados no registro: versão, memória estimada, requisições em voo e ociosidade."""
+    return services.models.stats()
+
+@router.post("/models/{name}/reload")
+async def reload_model(name: str):
+    """Hot-swap: carrega a versão publicada do artefato ao lado da atual e troca sem derrubar requisições."""
+    if name not in services.models.names():
+        raise HTTPException(status_code=404, detail=f"Modelo não registrado: {name}")
+    return await asyncio.get_running_loop().run_in_executor(None, services.models.swap, name)
+
+async def persist_turn(user_id: str, user_msg: str, ai_response: str):
+    with timed("chat.persist_ms"):
+        await services.redis.append_turn_async(user_id, user_msg, ai_response)
+    with timed("chat.summary_ms"):
+        await services.context_builder.refresh_summary(user_id)
+
+async def get_cached_response(intent: str, user_msg: str, history: list, user_id: str):
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return None, "disabled"
+    with timed("chat.cache_ms"):
+        return await services.response_cache.get(intent, user_msg, history, user_id)
+
+async def cache_response(intent: str, user_msg: str, history: list, ai_response: str, user_id: str):
+    if settings.RESPONSE_CACHE_ENABLED and ai_response and ai_response != FALLBACK_RESPONSE:
+        await services.response_cache.set(intent, user_msg, history, ai_response, user_id)
+
+async def classify_intent(user_msg: str):
+    # NOTE: a lease segura a instância atual até o fim da predição, mesmo se houver hot-swap no meio
+    async with services.models.lease_async("intent") as intent_service:
+        return await intent_service.predict_intent_async(user_msg, settings.POSSIBLE_INTENTS)
+
+async def prepare_turn(user_msg: str, user_id: str):
+    """Classifica a intenção e busca o histórico em paralelo, montando o prompt do turno."""
+    # NOTE: classificação e leitura do histórico são independentes, então rodam em paralelo
+    (detected_intent, confidence), history = await asyncio.gather(
+        timed_async("chat.intent_ms", classify_intent(user_msg)),
+        timed_async("chat.history_ms", services.context_builder.build_async(user_id)),
+    )
+
+    system_instruction = "Você é um assistente útil."
+    
+    if detected_intent == "falar sobre música" and confidence > 0.5:
+        system_instruction += " O usuário quer falar sobre música. Fale com ele sobre o assunto"
+    elif detected_intent == "reflexão":
+        system_instruction += " O usuário parece estar refletindo sobre diversas coisas. Seja um filósofo."
+
+    context_prompt = f"[Sistema: Intenção detectada: {detected_intent} ({confidence:.2f})]\n{user_msg}"
+    return detected_intent, confidence, history, context_prompt
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/chat")
+async def chat(payload: ChatRequest, background_tasks: BackgroundTasks):
+    user_msg = payload.message
+    user_id = payload.user_id
+
+    try:
+        detected_intent, confidence, history, context_prompt = await prepare_turn(user_msg, user_id)
+
+        ai_response, cache_status = await get_cached_response(detected_intent, user_msg, history, user_id)
+        if ai_response is None:
+            with timed("chat.llm_ms"):
+                ai_response = await services.llm.generate_response_async(
+                    prompt=context_prompt, 
+                    history=history,
+                )
+            background_tasks.add_task(cache_response, detected_intent, user_msg, history, ai_response, user_id)
         
-        # 5. Persistir
-        redis_service.add_message(user_id, "user", user_msg)
-        redis_service.add_message(user_id, "model", ai_response)
+        # 5. Persistir (depois que a resposta for enviada)
+        background_tasks.add_task(persist_turn, user_id, user_msg, ai_response)
 
         return {
             "response": ai_response,
             "metadata": {
                 "intent": detected_intent,
                 "confidence": confidence,
-                "model": llm_service.model_name
+                "model": services.llm.model_name,
+                "cache": cache_status
             }
         }
 
+    except InferenceBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -70,7 +340,88 @@ def chat(payload: ChatRequest):
             "response": "Desculpe, tive um problema ao processar sua solicitação." or ai_response,
             "metadata": {
                 "source": "llm_direct",
-                "model": llm_service.model_name,
+                "model": services.llm.model_name,
                 "error": str(undefined_error)
             }
         }
+
+
+@router.post("/chat/stream")
+async def chat_stream(payload: ChatRequest):
+    """
+    Mesma orquestração do /chat, mas a resposta chega via Server-Sent Events:
+    `meta` (intenção), vários `token` e, ao final, `done` com a resposta completa.
+    A resposta montada é persistida no Redis em background, depois que o stream termina.
+    """
+    user_msg = payload.message
+    user_id = payload.user_id
+
+    try:
+        detected_intent, confidence, history, context_prompt = await prepare_turn(user_msg, user_id)
+    except InferenceBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    cached_response, cache_status = await get_cached_response(detected_intent, user_msg, history, user_id)
+    turn = {}
+
+    async def finish_turn():
+        # NOTE: roda depois do último evento, como os BackgroundTasks do /chat (o resumo pode chamar o LLM)
+        if "response" not in turn:
+            return
+        await persist_turn(user_id, user_msg, turn["response"])
+        if cached_response is None:
+            await cache_response(detected_intent, user_msg, history, turn["response"], user_id)
+
+    async def event_stream():
+        yield sse_event("meta", {
+            "intent": detected_intent,
+            "confidence": confidence,
+            "model": services.llm.model_name,
+            "cache": cache_status
+        })
+
+        if cached_response is not None:
+            yield sse_event("token", {"text": cached_response})
+            yield sse_event("done", {"response": cached_response})
+            turn["response"] = cached_response
+            return
+
+        chunks = []
+        start = time.perf_counter()
+        try:
+            async for text in services.llm.stream_response_async(prompt=context_prompt, history=history):
+                if not chunks:
+                    metrics.histogram("chat.llm_first_token_ms").observe((time.perf_counter() - start) * 1000)
+                chunks.append(text)
+                yield sse_event("token", {"text": text})
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+            return
+
+        metrics.histogram("chat.llm_ms").observe((time.perf_counter() - start) * 1000)
+        ai_response = "".join(chunks)
+        yield sse_event("done", {"response": ai_response})
+        turn["response"] = ai_response
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        background=BackgroundTask(finish_turn),
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def create_app() -> FastAPI:
+    """Monta a aplicação. Barato: serviços e modelo são criados no warm-up ou na primeira requisição."""
+    start = time.perf_counter()
+    telemetry.setup()
+    app = FastAPI(title="Compound AI Orchestrator", lifespan=lifespan)
+    telemetry.instrument_app(app)
+    app.include_router(router)
+    startup_state["phases_ms"]["create_app_ms"] = (time.perf_counter() - start) * 1000
+    return app
+
+app = create_app()
@@ -0,0 +1,138 @@
+import os
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+
+from src.services.nlu_engine import InferenceBusyError
+
+logger = logging.getLogger("batcher")
+
+_STOP = object()
+
+class MicroBatcher:
+    """
+    Agrupa requisições concorrentes em um único batch antes de chamar `run_batch`.
+
+    Um batch é despachado quando atinge `max_batch_size` requisições ou quando a
+    primeira requisição da fila espera `max_wait_ms`, o que ocorrer primeiro.
+    `run_batch` recebe a lista de payloads e deve devolver uma lista de resultados
+    na mesma ordem.
+
+    Com `workers` > 1, vários batches são executados em paralelo (um por sessão do pool).
+    Acima de `max_queue` itens pendentes, `submit` rejeita com InferenceBusyError.
+    """
+    def __init__(
+        self,
+        run_batch,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        workers: int = 1,
+        max_queue: int = 256,
+        name: str = "batcher"
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+        self._stats = {"batches": 0, "items": 0, "rejected": 0, "max_batch": 0}
+
+    def submit(self, payload) -> Future:
+        """Enfileira um payload e devolve um Future com o resultado individual."""
+        self._ensure_workers()
+        if self._queue.qsize() >= self.max_queue:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise InferenceBusyError(f"Fila do {self.name} cheia ({self.max_queue} itens)")
+
+        future = Future()
+        self._queue.put((payload, future))
+        return future
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["avg_batch"] = stats["items"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def _alive(self) -> bool:
+        return self._pid == os.getpid() and all(t.is_alive() for t in self._threads)
+
+    def _ensure_workers(self):
+        # NOTE: threads não sobrevivem a um fork, então os workers são recriados no processo filho
+        if self._threads and self._alive():
+            return
+        with self._lock:
+            if self._threads and self._alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._threads = []
+            self._pid = os.getpid()
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._loop, name=f"{self.name}-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def close(self, timeout: float = 5.0):
+        """Encerra os workers depois de processar o que já está na fila."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP) # NOTE: despacha o batch atual e encerra na próxima volta
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            payloads = [payload for payload, _ in batch]
+            futures = [future for _, future in batch]
+
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["items"] += len(batch)
+                self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+
+            try:
+                results = self.run_batch(payloads)
+            except Exception as e:
+                logger.error(f"Erro no batch {self.name} ({len(batch)} itens): {e}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
@@ -0,0 +1,111 @@
+import json
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from src.utils.jsonl import record_text
+
+logger = logging.getLogger("bulk_classifier")
+
+ID_FIELDS = ("id", "request_id", "message_id")
+
+def read_records(path: str, text_field: str = None):
+    """
+    Gera (id, texto) linha a linha, sem carregar o arquivo. O texto vem de `text_field` ou do
+    primeiro campo de texto conhecido; o id, do primeiro campo de id conhecido ou do número da linha.
+    Linhas vazias, inválidas ou sem texto são puladas.
+    """
+    with open(path, "r") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Linha {line_no} não é JSON válido. Pulando.")
+                continue
+
+            text = record_text(record, text_field)
+            if not text:
+                continue
+            record_id = next((record[k] for k in ID_FIELDS if k in record), line_no)
+            yield str(record_id), text
+
+def chunked(iterable, size: int):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+def classify_stream(predict_batch, records, labels: list[str], batch_size: int = 256, workers: int = 2, max_pending: int = None):
+    """
+    Pipeline leitura -> lotes -> workers -> saída, preservando a ordem da entrada.
+    predict_batch: função (textos, labels) -> [(label, confiança)] (ex: IntentService.predict_batch)
+    No máximo `max_pending` lotes ficam em voo; o gerador só lê mais entrada depois de entregar
+    o lote mais antigo, então a memória não cresce com o tamanho do arquivo.
+    """
+    max_pending = max_pending or workers * 2
+    pending = deque()
+
+    def drain():
+        chunk, future = pending.popleft()
+        for (record_id, text), (label, confidence) in zip(chunk, future.result()):
+            yield {"id": record_id, "text": text, "intent": label, "confidence": confidence}
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk") as executor:
+        for chunk in chunked(records, batch_size):
+            if len(pending) >= max_pending:
+                yield from drain()
+            pending.append((chunk, executor.submit(predict_batch, [text for _, text in chunk], labels)))
+        while pending:
+            yield from drain()
+
+class JsonlWriter:
+    def __init__(self, path: str):
+        self._file = open(path, "w")
+
+    def write(self, row: dict):
+        self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self._file.close()
+
+class ParquetWriter:
+    """Grava um row group a cada `row_group_size` linhas (memória limitada ao buffer)."""
+    def __init__(self, path: str, row_group_size: int = 10000):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self.schema = pa.schema([
+            ("id", pa.string()),
+            ("text", pa.string()),
+            ("intent", pa.string()),
+            ("confidence", pa.float32()),
+        ])
+        self._writer = pq.ParquetWriter(path, self.schema)
+        self.row_group_size = row_group_size
+        self._buffer = []
+
+    def write(self, row: dict):
+        self._buffer.append(row)
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._writer.write_table(self._pa.Table.from_pylist(self._buffer, schema=self.schema))
+            self._buffer = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+def open_writer(path: str, output_format: str = None):
+    """Formato pela opção ou pela extensão (.parquet; o resto é JSONL)."""
+    output_format = output_format or ("parquet" if path.endswith(".parquet") else "jsonl")
+    if output_format == "parquet":
+        return ParquetWriter(path)
+    if output_format == "jsonl":
+        return JsonlWriter(path)
+    raise ValueError(f"Formato de saída desconhecido: {output_format}")
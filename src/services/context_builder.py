@@ -0,0 +1,121 @@
+import hashlib
+import logging
+from collections import OrderedDict
+
+from src.services.llm_service import FALLBACK_RESPONSE
+from src.utils.config import settings
+from src.utils.metrics import metrics
+
+logger = logging.getLogger("context_builder")
+
+SUMMARY_PROMPT = (
+    "Resuma a conversa abaixo em poucas frases, mantendo nomes, fatos e pedidos do usuário "
+    "que possam ser úteis para continuar o diálogo. Responda só com o resumo.\n\n"
+    "{previous}{messages}"
+)
+
+def message_fingerprint(message: dict) -> str:
+    return hashlib.sha1(f"{message['role']}\x1f{message['content']}".encode()).hexdigest()
+
+class ContextBuilder:
+    """
+    Monta o histórico enviado ao LLM dentro de um orçamento de tokens.
+
+    Mantém as mensagens mais recentes que cabem em `budget` tokens (contados com o tokenizer
+    local) e, se habilitado, troca as mais antigas por um resumo acumulado guardado no Redis.
+    O resumo é atualizado fora do caminho da requisição (refresh_summary, em background).
+    """
+    def __init__(self, redis_service, count_tokens, llm_service=None, budget: int = None, summarize: bool = None):
+        """
+        count_tokens: função list[str] -> list[int]
+        llm_service: usado só para gerar o resumo (summarize=True)
+        """
+        self.redis_service = redis_service
+        self.count_tokens = count_tokens
+        self.llm_service = llm_service
+        self.budget = budget or settings.CONTEXT_TOKEN_BUDGET
+        self.summarize = settings.CONTEXT_SUMMARY_ENABLED if summarize is None else summarize
+        self._token_cache = OrderedDict() # NOTE: contagem por mensagem, o histórico se repete entre turnos
+        self._token_cache_size = 8192
+
+    def _tokens(self, messages: list) -> list[int]:
+        keys = [message_fingerprint(m) for m in messages]
+        missing = [i for i, key in enumerate(keys) if key not in self._token_cache]
+        if missing:
+            counts = self.count_tokens([messages[i]["content"] for i in missing])
+            for i, count in zip(missing, counts):
+                self._token_cache[keys[i]] = count
+        for key in keys:
+            self._token_cache.move_to_end(key)
+        while len(self._token_cache) > self._token_cache_size:
+            self._token_cache.popitem(last=False)
+        return [self._token_cache[key] for key in keys]
+
+    def _split(self, messages: list, budget: int):
+        """Divide em (antigas, recentes): recentes é o maior sufixo que cabe no orçamento, começando no usuário."""
+        tokens = self._tokens(messages)
+        used = 0
+        start = len(messages)
+        for i in range(len(messages) - 1, -1, -1):
+            if used + tokens[i] > budget:
+                break
+            used += tokens[i]
+            start = i
+
+        while start < len(messages) and messages[start]["role"] != "user":
+            used -= tokens[start]
+            start += 1
+        return messages[:start], messages[start:], used
+
+    async def build_async(self, user_id: str) -> list:
+        """Histórico [{role, content}] pronto para o LLM, dentro do orçamento; o resumo vem com role `system`."""
+        messages = await self.redis_service.get_history_async(user_id)
+        summary = await self.redis_service.get_summary_async(user_id) if self.summarize else None
+
+        budget = self.budget
+        summary_message = None
+        if summary:
+            # NOTE: como instrução de sistema (LLMService._build_config), não como fala do usuário
+            summary_message = {"role": "system", "content": f"Resumo da conversa anterior: {summary['text']}"}
+            budget -= self._tokens([summary_message])[0]
+
+        older, recent, used = self._split(messages, max(budget, 0))
+        metrics.histogram("context.tokens").observe(used)
+        metrics.histogram("context.dropped_messages").observe(len(older))
+
+        if summary_message and older:
+            return [summary_message] + recent
+        return recent
+
+    async def refresh_summary(self, user_id: str):
+        """
+        Incorpora ao resumo as mensagens que já saíram do orçamento e ainda não foram resumidas.
+        Chamado em background depois de persistir o turno.
+        """
+        if not self.summarize or self.llm_service is None:
+            return
+
+        messages = await self.redis_service.get_history_async(user_id)
+        older, _, _ = self._split(messages, self.budget)
+        if not older:
+            return
+
+        summary = await self.redis_service.get_summary_async(user_id)
+        pending = older
+        if summary:
+            fingerprints = [message_fingerprint(m) for m in older]
+            if summary["last"] in fingerprints:
+                pending = older[fingerprints.index(summary["last"]) + 1:]
+        if not pending:
+            return
+
+        previous = f"Resumo até aqui: {summary['text']}\n\n" if summary else ""
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in pending)
+        text = await self.llm_service.generate_response_async(
+            prompt=SUMMARY_PROMPT.format(previous=previous, messages=transcript)
+        )
+        if not text or text == FALLBACK_RESPONSE:
+            return
+
+        await self.redis_service.set_summary_async(user_id, {"text": text, "last": message_fingerprint(pending[-1])})
+        logger.info(f"Resumo da sessão {user_id} atualizado com {len(pending)} mensagens.")
@@ -0,0 +1,353 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+import numpy as np
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from src.services.nlu_engine import NLUEngine
+from src.services.batcher import MicroBatcher
+from src.services.intent_cascade import IntentCascade, KeywordStage
+from src.utils.config import settings
+from src.utils.metrics import metrics
+from src.utils.telemetry import instrument
+from src.utils.text import normalize_text
+
+logger = logging.getLogger("embedding_intent_service")
+
+class LabelIndex:
+    """Matriz (n_labels, dim) de embeddings normalizados, uma linha por intenção."""
+    def __init__(self, labels: tuple, matrix: np.ndarray, key: str):
+        self.labels = labels
+        self.matrix = matrix
+        self.key = key
+
+
+class EmbeddingIntentService(NLUEngine):
+    """
+    Classificação de intenção por similaridade de embeddings.
+
+    Cada intenção vira um vetor (média dos embeddings do nome e das frases de exemplo),
+    calculado uma vez e salvo em disco ao lado do modelo. A mensagem passa uma única vez
+    pelo encoder e é comparada com todas as intenções num produto de matrizes, então o
+    custo quase não cresce com o número de intenções (ao contrário do NLI, que roda um
+    par premissa/hipótese por intenção).
+
+    Só os índices das labels registradas (register_labels/warm_up) são salvos em disco; os de
+    labels ad-hoc ficam num LRU em memória de até Settings.NLU_LABEL_SETS_MAX conjuntos.
+    """
+    def __init__(
+        self,
+        artifact_name: str = None,
+        runtime_dir: str = "/app/models/served",
+        model_variant: str = None,
+        batching: bool = None,
+        examples_path: str = None,
+        cascade: bool = None
+    ):
+        super().__init__(
+            artifact_name=artifact_name or settings.INTENT_EMBEDDING_ARTIFACT,
+            runtime_dir=runtime_dir,
+            model_variant=model_variant
+        )
+        self.max_length = 256
+        self.temperature = settings.INTENT_EMBEDDING_TEMPERATURE
+        self.examples_path = examples_path if examples_path is not None else settings.INTENT_EMBEDDING_EXAMPLES
+        self.reload_interval = settings.INTENT_INDEX_RELOAD_INTERVAL
+        self.batcher = None
+        self.executor = ThreadPoolExecutor(max_workers=settings.NLU_EXECUTOR_WORKERS, thread_name_prefix="nlu")
+
+        self._indexes = OrderedDict()
+        self._indexes_size = max(1, settings.NLU_LABEL_SETS_MAX)
+        self._registered = set()
+        self._index_lock = threading.Lock() # NOTE: serializa o cálculo dos índices
+        self._lru_lock = threading.Lock()
+        self._examples = {}
+        self._examples_mtime = None
+        self._last_reload_check = 0.0
+
+        if batching is None:
+            batching = settings.NLU_BATCHING_ENABLED
+
+        if batching:
+            self.batcher = MicroBatcher(
+                run_batch=self._run_batch,
+                max_batch_size=settings.NLU_BATCH_MAX_SIZE,
+                max_wait_ms=settings.NLU_BATCH_MAX_WAIT_MS,
+                workers=self.pool_size,
+                max_queue=settings.NLU_POOL_MAX_WAITING,
+                name="embedding_batcher"
+            )
+
+        if cascade is None:
+            cascade = settings.INTENT_CASCADE_ENABLED
+
+        # NOTE: só as regras; um estágio de centróides repetiria o próprio classificador por embeddings
+        self.cascade = None
+        if cascade:
+            self.cascade = IntentCascade([
+                KeywordStage.from_file(settings.INTENT_RULES_PATH, settings.INTENT_KEYWORD_CONFIDENCE),
+            ])
+
+    def _configure_tokenizer(self):
+        self.tokenizer.enable_truncation(max_length=self.max_length)
+
+    def _read_examples(self) -> dict:
+        if not self.examples_path or not os.path.exists(self.examples_path):
+            return {}
+        examples = {}
+        with open(self.examples_path, "r") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    examples.setdefault(record["intent"], []).append(record["text"])
+        return examples
+
+    def _reload_due(self) -> bool:
+        return self._examples_mtime is None or time.monotonic() - self._last_reload_check >= self.reload_interval
+
+    def _check_examples(self):
+        """Relê o arquivo de exemplos se ele mudou (no máximo a cada `reload_interval` segundos)."""
+        if not self._reload_due():
+            return
+        self._last_reload_check = time.monotonic()
+
+        mtime = os.path.getmtime(self.examples_path) if self.examples_path and os.path.exists(self.examples_path) else 0
+        if mtime == self._examples_mtime:
+            return
+
+        examples = self._read_examples()
+        with self._index_lock:
+            reloading = self._examples_mtime is not None
+            self._examples = examples
+            self._examples_mtime = mtime
+            if reloading:
+                # NOTE: os índices antigos continuam servindo até o novo ficar pronto
+                with self._lru_lock:
+                    cached = list(self._indexes)
+                for labels in cached:
+                    self._store_index(labels, self._build_index(labels))
+        if reloading:
+            logger.info(f"Exemplos de {self.examples_path} alterados. Índices de labels recalculados.")
+
+    def _index_key(self, labels: tuple) -> str:
+        payload = {
+            "artifact_version": self.artifact_version,
+            "labels": list(labels),
+            "examples": {label: self._examples.get(label, []) for label in labels},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:16]
+
+    def _build_index(self, labels: tuple) -> LabelIndex:
+        """Carrega o índice salvo para (modelo, labels, exemplos) ou calcula (e salva, se as labels forem registradas)."""
+        key = self._index_key(labels)
+        index_path = os.path.join(self.cache_dir, f"label_index.{key}.npy")
+        persist = labels in self._registered
+        if persist and os.path.exists(index_path):
+            return LabelIndex(labels, np.load(index_path), key)
+
+        rows = []
+        for label in labels:
+            texts = [normalize_text(label)] + [normalize_text(t) for t in self._examples.get(label, [])]
+            centroid = self.embed(texts).mean(axis=0)
+            rows.append(centroid / np.linalg.norm(centroid))
+        matrix = np.stack(rows).astype(np.float32)
+        if not persist:
+            return LabelIndex(labels, matrix, key)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{index_path}.tmp-{os.getpid()}.npy"
+        np.save(tmp_path, matrix)
+        os.replace(tmp_path, index_path)
+
+        logger.info(f"Índice de {len(labels)} labels calculado e salvo em {index_path}.")
+        return LabelIndex(labels, matrix, key)
+
+    def _cached_index(self, labels: tuple):
+        with self._lru_lock:
+            index = self._indexes.get(labels)
+            if index is not None:
+                self._indexes.move_to_end(labels)
+            return index
+
+    def _store_index(self, labels: tuple, index: LabelIndex):
+        with self._lru_lock:
+            self._indexes[labels] = index
+            self._indexes.move_to_end(labels)
+            # NOTE: as labels registradas não saem do LRU; só as ad-hoc
+            evictable = [cached for cached in self._indexes if cached not in self._registered]
+            while len(self._indexes) > self._indexes_size and evictable:
+                del self._indexes[evictable.pop(0)]
+
+    def _get_index(self, candidate_labels: list[str]) -> LabelIndex:
+        self._check_examples()
+        labels = tuple(candidate_labels)
+        index = self._cached_index(labels)
+        if index is None:
+            with self._index_lock:
+                index = self._cached_index(labels)
+                if index is None:
+                    index = self._build_index(labels)
+                    self._store_index(labels, index)
+        return index
+
+    def register_labels(self, candidate_labels: list[str]):
+        """
+        Calcula (ou carrega do disco) o índice das labels. Chamar de novo com outra lista
+        troca o índice sem reiniciar o serviço. Antes do load, o índice fica para o primeiro uso.
+        """
+        labels = tuple(candidate_labels)
+        self._registered.add(labels)
+        if not self.session:
+            return
+        self._check_examples()
+        self._store_index(labels, self._build_index(labels))
+
+    def _run_batch(self, texts: list[str]) -> list[np.ndarray]:
+        metrics.histogram("nlu.batch_size").observe(len(texts))
+        return list(self.embed(texts))
+
+    def _classify(self, vector: np.ndarray, index: LabelIndex):
+        scores = index.matrix @ vector
+        logits = scores / self.temperature
+        exp_logits = np.exp(logits - logits.max())
+        probs = exp_logits / exp_logits.sum()
+        best_idx = int(np.argmax(probs))
+        return index.labels[best_idx], float(probs[best_idx])
+
+    def warm_up(self, candidate_labels: list[str]) -> dict:
+        """Carrega o modelo, prepara o índice das labels e roda uma inferência fictícia."""
+        self._ensure_loaded()
+
+        start = time.perf_counter()
+        self.register_labels(candidate_labels)
+        self.load_timings["labels_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        self.embed(["warm-up"])
+        self.load_timings["warmup_ms"] = (time.perf_counter() - start) * 1000
+        return dict(self.load_timings)
+
+    def unload(self):
+        """Além das sessões, encerra o batcher e o executor: a instância não volta a ser usada."""
+        if self.batcher:
+            self.batcher.close()
+        self.executor.shutdown(wait=False)
+        super().unload()
+        self._indexes = OrderedDict()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["batcher"] = self.batcher.stats() if self.batcher else None
+        stats["cascade"] = self.cascade.stats() if self.cascade else None
+        with self._lru_lock:
+            indexes = list(self._indexes.items())
+        stats["label_indexes"] = [{"labels": len(labels), "key": index.key} for labels, index in indexes]
+        return stats
+
+    def _predict_cascade(self, text: str, candidate_labels: list[str]):
+        """Regras da cascata; None quando a mensagem precisa do encoder."""
+        result = self.cascade.predict(text, candidate_labels)
+        return result[:2] if result else None
+
+    @instrument(name="nlu_predict_intent_embedding")
+    def predict_intent(self, text: str, candidate_labels: list[str]):
+        """Uma passada no encoder + produto com a matriz de labels."""
+        if self.cascade:
+            shortcut = self._predict_cascade(text, candidate_labels)
+            if shortcut:
+                return shortcut
+
+        self._ensure_loaded()
+        index = self._get_index(candidate_labels)
+
+        key = None
+        if self.prediction_cache:
+            key = self._prediction_key(text, candidate_labels, index.key)
+            cached = self.prediction_cache.get(key)
+            if cached:
+                return cached
+
+        text = normalize_text(text)
+        if self.batcher:
+            vector = self.batcher.submit(text).result()
+        else:
+            vector = self.embed([text])[0]
+
+        result = self._classify(vector, index)
+        if key:
+            self.prediction_cache.set(key, result)
+        return result
+
+    @instrument(name="nlu_predict_batch_embedding")
+    def predict_batch(self, texts: list[str], candidate_labels: list[str]) -> list[tuple]:
+        """
+        Vários textos de uma vez: cascata e cache como em predict_intent; o restante vai ao
+        encoder em lotes de Settings.NLU_BATCH_MAX_SIZE, sem o micro-batcher.
+        """
+        results = [None] * len(texts)
+        pending = []
+        for i, text in enumerate(texts):
+            shortcut = self._predict_cascade(text, candidate_labels) if self.cascade else None
+            if shortcut:
+                results[i] = shortcut
+            else:
+                pending.append(i)
+        if not pending:
+            return results
+
+        self._ensure_loaded()
+        index = self._get_index(candidate_labels)
+
+        keys = {}
+        if self.prediction_cache:
+            for i in pending:
+                keys[i] = self._prediction_key(texts[i], candidate_labels, index.key)
+                results[i] = self.prediction_cache.get(keys[i])
+            pending = [i for i in pending if results[i] is None]
+
+        size = settings.NLU_BATCH_MAX_SIZE
+        for start in range(0, len(pending), size):
+            chunk = pending[start:start + size]
+            vectors = self._run_batch([normalize_text(texts[i]) for i in chunk])
+            for i, vector in zip(chunk, vectors):
+                results[i] = self._classify(vector, index)
+                if i in keys:
+                    self.prediction_cache.set(keys[i], results[i])
+        return results
+
+    @instrument(name="nlu_predict_intent_embedding_async")
+    async def predict_intent_async(self, text: str, candidate_labels: list[str]):
+        loop = asyncio.get_running_loop()
+
+        if not self.batcher:
+            return await loop.run_in_executor(self.executor, self.predict_intent, text, candidate_labels)
+
+        if self.cascade:
+            shortcut = self._predict_cascade(text, candidate_labels) # NOTE: só regex, barato para o event loop
+            if shortcut:
+                return shortcut
+
+        index = self._cached_index(tuple(candidate_labels))
+        if not self.session or index is None or self._reload_due():
+            # NOTE: load e (re)cálculo do índice rodam no executor, fora do event loop
+            await loop.run_in_executor(self.executor, self._ensure_loaded)
+            index = await loop.run_in_executor(self.executor, self._get_index, candidate_labels)
+
+        key = None
+        if self.prediction_cache:
+            key = self._prediction_key(text, candidate_labels, index.key)
+            cached = await self.prediction_cache.get_async(key)
+            if cached:
+                return cached
+
+        vector = await asyncio.wrap_future(self.batcher.submit(normalize_text(text)))
+        result = self._classify(vector, index)
+        if key:
+            await self.prediction_cache.set_async(key, result)
+        return result
@@ -0,0 +1,37 @@
+import time
+import asyncio
+
+from src.utils.config import settings
+
+class FakeLLMService:
+    """
+    Substituto local do LLMService, sem chamadas de rede.
+    Simula a latência até o primeiro token e o intervalo entre tokens,
+    para testes e benchmarks do orquestrador (LLM_BACKEND=fake).
+    """
+    def __init__(self, latency_ms: float = None, token_delay_ms: float = None):
+        self.model_name = "fake-llm"
+        self.latency = (settings.FAKE_LLM_LATENCY_MS if latency_ms is None else latency_ms) / 1000.0
+        self.token_delay = (settings.FAKE_LLM_TOKEN_DELAY_MS if token_delay_ms is None else token_delay_ms) / 1000.0
+
+    def _answer(self, prompt: str, history: list = None) -> list[str]:
+        turns = len(history or [])
+        text = f"Resposta simulada ({turns} mensagens de histórico) para: {prompt.splitlines()[-1]}"
+        words = text.split(" ")
+        return words[:1] + [" " + word for word in words[1:]]
+
+    def generate_response(self, prompt: str, history: list = None) -> str:
+        tokens = self._answer(prompt, history)
+        time.sleep(self.latency + self.token_delay * len(tokens))
+        return "".join(tokens)
+
+    async def generate_response_async(self, prompt: str, history: list = None) -> str:
+        tokens = self._answer(prompt, history)
+        await asyncio.sleep(self.latency + self.token_delay * len(tokens))
+        return "".join(tokens)
+
+    async def stream_response_async(self, prompt: str, history: list = None):
+        await asyncio.sleep(self.latency)
+        for token in self._answer(prompt, history):
+            yield token
+            await asyncio.sleep(self.token_delay)
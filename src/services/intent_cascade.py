@@ -0,0 +1,168 @@
+import os
+import re
+import json
+import logging
+import threading
+import numpy as np
+
+from src.utils.metrics import metrics
+from src.utils.text import normalize_text
+
+logger = logging.getLogger("intent_cascade")
+
+class KeywordStage:
+    """
+    Primeiro estágio: regras regex por intenção, aplicadas (fullmatch) sobre o texto normalizado.
+    Só responde quando exatamente uma das intenções candidatas casa.
+    """
+    name = "keyword"
+
+    def __init__(self, rules: dict, confidence: float):
+        """rules: {intenção: [regex, ...]}"""
+        self.confidence = confidence
+        self.rules = {
+            label: [re.compile(pattern) for pattern in patterns]
+            for label, patterns in rules.items()
+        }
+
+    @classmethod
+    def from_file(cls, path: str, confidence: float):
+        if not path or not os.path.exists(path):
+            logger.warning(f"Regras de intenção {path} não encontradas. Estágio de keywords desativado.")
+            return None
+        with open(path, "r") as f:
+            return cls(json.load(f), confidence)
+
+    def predict(self, text: str, candidate_labels: list[str]):
+        normalized = normalize_text(text)
+        matches = [
+            label for label in candidate_labels
+            if any(pattern.fullmatch(normalized) for pattern in self.rules.get(label, ()))
+        ]
+        if len(matches) != 1:
+            return None
+        return matches[0], self.confidence
+
+
+class CentroidStage:
+    """
+    Segundo estágio: embedding da mensagem contra o centróide dos exemplos de cada intenção.
+    Responde quando a similaridade passa de `threshold` e a distância para a segunda
+    intenção mais próxima é de pelo menos `margin`. Os embeddings vêm de um modelo próprio
+    (o intent_embedder), não do NLI; se o embed não gerar embeddings (ValueError), o estágio
+    se desativa de vez.
+    """
+    name = "centroid"
+
+    def __init__(self, embed, examples: dict, threshold: float, margin: float):
+        """
+        embed: função list[str] -> np.ndarray de embeddings normalizados
+        examples: {intenção: [frases de exemplo, ...]}
+        """
+        self.embed = embed
+        self.examples = examples
+        self.threshold = threshold
+        self.margin = margin
+        self._centroids = None
+        self._lock = threading.Lock()
+        self.disabled = False
+
+    @classmethod
+    def from_file(cls, embed, path: str, threshold: float, margin: float):
+        """Lê exemplos em JSONL no mesmo formato do conjunto de avaliação ({"text", "intent"})."""
+        if not path or not os.path.exists(path):
+            return None
+        examples = {}
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    examples.setdefault(record["intent"], []).append(record["text"])
+        return cls(embed, examples, threshold, margin)
+
+    def _ensure_centroids(self):
+        if self._centroids is not None:
+            return
+        with self._lock:
+            if self._centroids is None:
+                centroids = {}
+                for label, texts in self.examples.items():
+                    centroid = self.embed([normalize_text(t) for t in texts]).mean(axis=0)
+                    centroids[label] = centroid / np.linalg.norm(centroid)
+                self._centroids = centroids
+                logger.info(f"Centróides de {len(centroids)} intenções calculados.")
+
+    def _disable(self, error: ValueError):
+        if not self.disabled:
+            self.disabled = True
+            logger.warning(f"Estágio de centróides desativado: o modelo não gera embeddings ({error}).")
+
+    def predict(self, text: str, candidate_labels: list[str]):
+        if self.disabled:
+            return None
+        try:
+            self._ensure_centroids()
+        except ValueError as e:
+            self._disable(e)
+            return None
+        labels = [label for label in candidate_labels if label in self._centroids]
+        if len(labels) < 2:
+            return None
+
+        try:
+            vector = self.embed([normalize_text(text)])[0]
+        except ValueError as e:
+            self._disable(e)
+            return None
+        scores = np.stack([self._centroids[label] for label in labels]) @ vector
+        order = np.argsort(scores)[::-1]
+        best, second = float(scores[order[0]]), float(scores[order[1]])
+        if best < self.threshold or best - second < self.margin:
+            return None
+        return labels[order[0]], best
+
+
+class IntentCascade:
+    """
+    Estágios baratos antes do modelo NLI. O primeiro estágio confiante responde;
+    mensagens incertas seguem para o modelo completo. Conta os acertos por estágio.
+    """
+    def __init__(self, stages: list):
+        self.stages = [stage for stage in stages if stage is not None]
+        self._lock = threading.Lock()
+        self._counts = {"requests": 0, "model": 0, **{stage.name: 0 for stage in self.stages}}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counts["requests"] += 1
+            self._counts[name] += 1
+        metrics.counter(f"intent.cascade.{name}").inc()
+
+    def predict(self, text: str, candidate_labels: list[str]):
+        """Retorna (intenção, confiança, estágio) ou None se nenhum estágio tiver certeza."""
+        for stage in self.stages:
+            if getattr(stage, "disabled", False):
+                continue
+            try:
+                result = stage.predict(text, candidate_labels)
+            except Exception as e:
+                logger.warning(f"Estágio {stage.name} falhou, pulando: {e}")
+                continue
+            if result is not None:
+                self._count(stage.name)
+                return result[0], result[1], stage.name
+        self._count("model")
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        total = counts["requests"]
+        return {
+            **counts,
+            "disabled": [stage.name for stage in self.stages if getattr(stage, "disabled", False)],
+            "hit_rate": {
+                name: (count / total if total else 0.0)
+                for name, count in counts.items() if name != "requests"
+            },
+        }
@@ -1,23 +1,95 @@
+import time
+import asyncio
 import numpy as np
 import json
 import logging
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from src.services.nlu_engine import NLUEngine
+from src.services.batcher import MicroBatcher
+from src.services.intent_cascade import IntentCascade, KeywordStage, CentroidStage
+from src.utils.config import settings
+from src.utils.metrics import metrics, timed
 from src.utils.telemetry import instrument
 
 logger = logging.getLogger("intent_service")
 
+HYPOTHESIS_TEMPLATE = "This text is about {}."
+
+class LabelSet:
+    """
+    Hipóteses de um conjunto fixo de labels já tokenizadas.
+    Guarda apenas o trecho da hipótese (após o separador da premissa),
+    em arrays (n_labels, max_len) preenchidos com padding.
+    """
+    def __init__(self, labels: tuple, ids: np.ndarray, attention_mask: np.ndarray, type_ids: np.ndarray):
+        self.labels = labels
+        self.ids = ids
+        self.attention_mask = attention_mask
+        self.type_ids = type_ids
+
 class IntentService(NLUEngine):
-    def __init__(self):
-        super().__init__(artifact_name="intent_classifier.zip")
+    def __init__(
+        self,
+        artifact_name: str = "intent_classifier.zip",
+        runtime_dir: str = "/app/models/served",
+        model_variant: str = None,
+        batching: bool = None,
+        cascade: bool = None,
+        embed=None
+    ):
+        """
+        embed: função list[str] -> embeddings para o estágio de centróides da cascata.
+        O modelo NLI não gera embeddings: passe o de outro modelo (ex: o intent_embedder); sem ele, o estágio fica de fora.
+        """
+        super().__init__(artifact_name=artifact_name, runtime_dir=runtime_dir, model_variant=model_variant)
         self.entailment_id = None
+        self.pad_id = 0
+        self.batcher = None
+        self.max_length = 512
+        self._label_sets = OrderedDict() # NOTE: LRU; labels ad-hoc (ex: /classify/batch) não crescem a memória sem limite
+        self._label_sets_size = max(1, settings.NLU_LABEL_SETS_MAX)
+        self._label_sets_lock = threading.Lock()
+        self._registered = set()
+        self.executor = ThreadPoolExecutor(max_workers=settings.NLU_EXECUTOR_WORKERS, thread_name_prefix="nlu")
+
+        if batching is None:
+            batching = settings.NLU_BATCHING_ENABLED
 
-    def _setup_tokenizer_config(self):
+        if batching:
+            self.batcher = MicroBatcher(
+                run_batch=self._run_batch,
+                max_batch_size=settings.NLU_BATCH_MAX_SIZE,
+                max_wait_ms=settings.NLU_BATCH_MAX_WAIT_MS,
+                workers=self.pool_size,
+                max_queue=settings.NLU_POOL_MAX_WAITING,
+                name="intent_batcher"
+            )
+
+        if cascade is None:
+            cascade = settings.INTENT_CASCADE_ENABLED
+
+        self.cascade = None
+        if cascade:
+            self.cascade = IntentCascade([
+                KeywordStage.from_file(settings.INTENT_RULES_PATH, settings.INTENT_KEYWORD_CONFIDENCE),
+                CentroidStage.from_file(
+                    embed,
+                    settings.INTENT_CENTROID_EXAMPLES,
+                    settings.INTENT_CENTROID_THRESHOLD,
+                    settings.INTENT_CENTROID_MARGIN
+                ) if embed else None,
+            ])
+
+    def _configure_tokenizer(self):
         """
         Configura padding e truncation explícitos para o tokenizer raw.
         Necessário para processamento em batch.
         """
-        self.tokenizer.enable_truncation(max_length=512)
+        self.tokenizer.enable_truncation(max_length=self.max_length)
 
         pad_id = 0
         if self.tokenizer.token_to_id("[PAD]"):
@@ -25,6 +97,7 @@ class IntentService(NLUEngine):
         elif self.tokenizer.token_to_id("<pad>"):
             pad_id = self.tokenizer.token_to_id("<pad>")
             
+        self.pad_id = pad_id
         self.tokenizer.enable_padding(pad_id=pad_id, pad_token="[PAD]")
 
     def _get_entailment_id(self):
@@ -49,43 +122,351 @@ class IntentService(NLUEngine):
             logger.error(f"Erro ao ler config.json: {e}")
             return 2
 
-    @instrument(name="nlu_predict_intent")
-    def predict_intent(self, text: str, candidate_labels: list[str]):
+    def register_labels(self, candidate_labels: list[str]):
         """
-        Realiza Zero-Shot Classification de forma dinâmica.
-        Verifica quais inputs o modelo aceita antes de enviar.
+        Prepara um conjunto de labels: as hipóteses são tokenizadas uma vez e reaproveitadas
+        em todas as requisições. Antes do load, fica para o primeiro uso.
         """
-        if not self.session:
-            self.load()
-            self._setup_tokenizer_config()
+        labels = tuple(candidate_labels)
+        self._registered.add(labels)
+        if self.session:
+            self._label_set(labels)
 
-        entailment_id = self._get_entailment_id()
-        hypothesis_template = "This text is about {}."
+    def _label_set(self, labels: tuple):
+        """
+        LabelSet das labels (False se o tokenizer não permitir a emenda), tokenizado no primeiro uso
+        e guardado num LRU de até Settings.NLU_LABEL_SETS_MAX conjuntos (as registradas ficam sempre).
+        """
+        with self._label_sets_lock:
+            label_set = self._label_sets.get(labels)
+            if label_set is not None:
+                self._label_sets.move_to_end(labels)
+                return label_set
 
-        text_pairs = [(text, hypothesis_template.format(label)) for label in candidate_labels]
+        label_set = self._build_label_set(labels)
+        with self._label_sets_lock:
+            self._label_sets[labels] = label_set
+            # NOTE: as labels registradas não saem do LRU; só as ad-hoc
+            evictable = [cached for cached in self._label_sets if cached not in self._registered]
+            while len(self._label_sets) > self._label_sets_size and evictable:
+                del self._label_sets[evictable.pop(0)]
+        return label_set
 
-        encodings = self.tokenizer.encode_batch(text_pairs)
+    def _build_label_set(self, labels: tuple):
+        """
+        Tokeniza as hipóteses com premissa vazia e guarda só o sufixo da hipótese.
+        Retorna False se o template do tokenizer não permitir a emenda.
+        """
+        prefix_len = len(self.tokenizer.encode("").ids)
+        encodings = [self.tokenizer.encode("", HYPOTHESIS_TEMPLATE.format(label)) for label in labels]
 
-        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
-        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        width = max(len(e.ids) - prefix_len for e in encodings)
+        ids = np.full((len(labels), width), self.pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(labels), width), dtype=np.int64)
+        type_ids = np.zeros((len(labels), width), dtype=np.int64)
 
-        model_input_names = [i.name for i in self.session.get_inputs()]
-        
-        onnx_inputs = {
+        for row, encoding in enumerate(encodings):
+            size = len(encoding.ids) - prefix_len
+            ids[row, :size] = encoding.ids[prefix_len:]
+            attention_mask[row, :size] = 1
+            type_ids[row, :size] = encoding.type_ids[prefix_len:]
+
+        label_set = LabelSet(labels, ids, attention_mask, type_ids)
+
+        # NOTE: confere a emenda contra o encode de par completo antes de confiar no cache
+        probe = "probe text"
+        expected = self.tokenizer.encode(probe, HYPOTHESIS_TEMPLATE.format(labels[0]))
+        spliced = self._splice(probe, label_set)
+        if spliced["input_ids"][0][spliced["attention_mask"][0] == 1].tolist() != expected.ids:
+            logger.warning("Template do tokenizer incompatível com o cache de hipóteses. Usando encode completo.")
+            return False
+
+        logger.info(f"Hipóteses de {len(labels)} labels registradas no cache.")
+        return label_set
+
+    def _splice(self, text: str, label_set: LabelSet) -> dict:
+        """
+        Tokeniza só a premissa e a emenda às hipóteses já tokenizadas.
+        Premissas longas são truncadas para caber junto da maior hipótese.
+        """
+        premise = self.tokenizer.encode(text)
+        premise_ids = premise.ids
+        premise_type_ids = premise.type_ids
+
+        overflow = len(premise_ids) + label_set.ids.shape[1] - self.max_length
+        if overflow > 0:
+            trailing = 0
+            while trailing < len(premise.special_tokens_mask) and premise.special_tokens_mask[-1 - trailing]:
+                trailing += 1
+            keep = len(premise_ids) - trailing - overflow
+            premise_ids = premise_ids[:keep] + premise_ids[len(premise_ids) - trailing:]
+            premise_type_ids = premise_type_ids[:keep] + premise_type_ids[len(premise_type_ids) - trailing:]
+
+        n_labels = len(label_set.labels)
+        split = len(premise_ids)
+        width = split + label_set.ids.shape[1]
+
+        input_ids = np.empty((n_labels, width), dtype=np.int64)
+        input_ids[:, :split] = premise_ids
+        input_ids[:, split:] = label_set.ids
+
+        attention_mask = np.empty((n_labels, width), dtype=np.int64)
+        attention_mask[:, :split] = 1
+        attention_mask[:, split:] = label_set.attention_mask
+
+        token_type_ids = np.empty((n_labels, width), dtype=np.int64)
+        token_type_ids[:, :split] = premise_type_ids
+        token_type_ids[:, split:] = label_set.type_ids
+
+        return {
             "input_ids": input_ids,
-            "attention_mask": attention_mask
+            "attention_mask": attention_mask,
+            "token_type_ids": token_type_ids,
+        }
+
+    def _encode(self, text: str, candidate_labels: list[str]) -> dict:
+        """Tokeniza os pares (premissa, hipótese) de uma mensagem."""
+        with timed("nlu.tokenize_ms"):
+            return self._encode_pairs(text, candidate_labels)
+
+    def _encode_pairs(self, text: str, candidate_labels: list[str]) -> dict:
+        label_set = self._label_set(tuple(candidate_labels))
+        if label_set:
+            return self._splice(text, label_set)
+
+        text_pairs = [(text, HYPOTHESIS_TEMPLATE.format(label)) for label in candidate_labels]
+
+        encodings = self.tokenizer.encode_batch(text_pairs)
+
+        return {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
         }
 
-        if "token_type_ids" in model_input_names:
-            token_type_ids = np.array([e.type_ids for e in encodings], dtype=np.int64)
-            onnx_inputs["token_type_ids"] = token_type_ids
+    def _run_batch(self, batch: list[dict]) -> list[np.ndarray]:
+        """
+        Agrupa as mensagens por bucket de comprimento e executa um session.run por bucket.
+        Mensagens curtas não são mais preenchidas até o tamanho das longas: cada grupo
+        recebe padding só até a maior sequência do grupo (no máximo, o tamanho do bucket).
+        Devolve, para cada mensagem, o softmax sobre os seus próprios candidatos.
+        """
+        metrics.histogram("nlu.batch_size").observe(len(batch))
+
+        buckets = {}
+        for idx, item in enumerate(batch):
+            bucket = self._bucket_length(item["input_ids"].shape[1])
+            buckets.setdefault(bucket, []).append(idx)
+
+        results = [None] * len(batch)
+        for indexes in buckets.values():
+            group = [batch[i] for i in indexes]
+            length = max(item["input_ids"].shape[1] for item in group)
+            group_results = self._run_padded(group, length)
+            for idx, probs in zip(indexes, group_results):
+                results[idx] = probs
+
+        return results
+
+    def _model_inputs(self, batch: list[dict], length: int) -> dict:
+        """Concatena as mensagens do batch com padding até `length`, só com as entradas que o modelo aceita."""
+        pad_values = {"input_ids": self.pad_id, "attention_mask": 0, "token_type_ids": 0}
+        model_input_names = [i.name for i in self.session.get_inputs()]
+
+        onnx_inputs = {}
+        for name, pad_value in pad_values.items():
+            if name not in model_input_names:
+                continue
+            onnx_inputs[name] = np.concatenate(
+                [self._pad_to(item[name], length, pad_value) for item in batch]
+            )
+        return onnx_inputs
+
+    def _run_padded(self, batch: list[dict], length: int) -> list[np.ndarray]:
+        entailment_id = self._get_entailment_id()
+        onnx_inputs = self._model_inputs(batch, length)
+
+        self._record_padding(onnx_inputs["attention_mask"])
 
-        logits = self.session.run(None, onnx_inputs)[0]
-        
+        with self.pool.acquire() as session, timed("nlu.session_run_ms"):
+            logits = session.run(None, onnx_inputs)[0]
         entailment_logits = logits[:, entailment_id]
 
-        exp_logits = np.exp(entailment_logits - np.max(entailment_logits))
-        probs = exp_logits / exp_logits.sum()
+        results = []
+        offset = 0
+        for item in batch:
+            size = item["input_ids"].shape[0]
+            scores = entailment_logits[offset:offset + size]
+            offset += size
+
+            exp_logits = np.exp(scores - np.max(scores))
+            results.append(exp_logits / exp_logits.sum())
+
+        return results
+
+    def warm_up(self, candidate_labels: list[str]) -> dict:
+        """
+        Carrega o modelo e roda batches fictícios em todas as sessões do pool, um por bucket
+        de comprimento até Settings.NLU_WARMUP_MAX_LENGTH, para que a primeira requisição real
+        não pague a alocação de memória e a preparação dos kernels do ONNX Runtime.
+        Retorna a duração de cada fase (ms).
+        """
+        self._ensure_loaded()
+
+        start = time.perf_counter()
+        self.register_labels(candidate_labels)
+        encoded = self._encode("warm-up", candidate_labels)
+        self.load_timings["labels_ms"] = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        width = encoded["input_ids"].shape[1]
+        lengths = [b for b in self.length_buckets if width <= b <= settings.NLU_WARMUP_MAX_LENGTH] or [width]
+        for session in self.sessions:
+            for length in lengths:
+                session.run(None, self._model_inputs([encoded], length))
+        self.load_timings["warmup_ms"] = (time.perf_counter() - start) * 1000
+
+        logger.info(f"Warm-up de {len(self.sessions)} sessões nos comprimentos {lengths}.")
+        return dict(self.load_timings)
+
+    def unload(self):
+        """Além das sessões, encerra o batcher e o executor: a instância não volta a ser usada."""
+        if self.batcher:
+            self.batcher.close()
+        self.executor.shutdown(wait=False)
+        super().unload()
+        self._label_sets = OrderedDict()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["batcher"] = self.batcher.stats() if self.batcher else None
+        stats["cascade"] = self.cascade.stats() if self.cascade else None
+        return stats
+
+    def _predict_cascade(self, text: str, candidate_labels: list[str]):
+        """Estágios baratos da cascata; None quando a mensagem precisa do modelo NLI."""
+        result = self.cascade.predict(text, candidate_labels)
+        return result[:2] if result else None
+
+    @instrument(name="nlu_predict_intent")
+    def predict_intent(self, text: str, candidate_labels: list[str]):
+        """
+        Realiza Zero-Shot Classification de forma dinâmica.
+        Com o micro-batching ativo, os pares de requisições concorrentes
+        são executados juntos em um único session.run.
+        Com a cascata ativa, mensagens resolvidas pelos estágios baratos não chegam ao modelo.
+        """
+        if self.cascade:
+            shortcut = self._predict_cascade(text, candidate_labels)
+            if shortcut:
+                return shortcut
+
+        self._ensure_loaded()
+
+        key = None
+        if self.prediction_cache:
+            key = self._prediction_key(text, candidate_labels, HYPOTHESIS_TEMPLATE)
+            cached = self.prediction_cache.get(key)
+            if cached:
+                return cached
+
+        encoded = self._encode(text, candidate_labels)
+
+        if self.batcher:
+            probs = self.batcher.submit(encoded).result()
+        else:
+            probs = self._run_batch([encoded])[0]
+
+        result = self._best(probs, candidate_labels)
+        if key:
+            self.prediction_cache.set(key, result)
+        return result
+
+    @instrument(name="nlu_predict_batch")
+    def predict_batch(self, texts: list[str], candidate_labels: list[str]) -> list[tuple]:
+        """
+        Classifica vários textos de uma vez (endpoint /classify/batch e inferência offline).
+        Cascata e cache valem como em predict_intent; o restante vai direto ao modelo em lotes
+        de Settings.NLU_BATCH_MAX_SIZE mensagens, sem passar pelo micro-batcher.
+        """
+        results = [None] * len(texts)
+        pending = []
+        for i, text in enumerate(texts):
+            shortcut = self._predict_cascade(text, candidate_labels) if self.cascade else None
+            if shortcut:
+                results[i] = shortcut
+            else:
+                pending.append(i)
+        if not pending:
+            return results
+
+        self._ensure_loaded()
+
+        keys = {}
+        if self.prediction_cache:
+            misses = []
+            for i in pending:
+                keys[i] = self._prediction_key(texts[i], candidate_labels, HYPOTHESIS_TEMPLATE)
+                results[i] = self.prediction_cache.get(keys[i])
+                if results[i] is None:
+                    misses.append(i)
+            pending = misses
+
+        size = settings.NLU_BATCH_MAX_SIZE
+        for start in range(0, len(pending), size):
+            chunk = pending[start:start + size]
+            probs = self._run_batch([self._encode(texts[i], candidate_labels) for i in chunk])
+            for i, row in zip(chunk, probs):
+                results[i] = self._best(row, candidate_labels)
+                if i in keys:
+                    self.prediction_cache.set(keys[i], results[i])
+        return results
+
+    def _prepare(self, text: str, candidate_labels: list[str]):
+        """
+        Etapas antes do batcher, numa única ida ao executor: cascata, load, cache e tokenização
+        (inclusive o _build_label_set do primeiro uso de um conjunto de labels).
+        Retorna (resultado, chave do cache, entrada tokenizada); resultado só quando não precisa do batch.
+        """
+        if self.cascade:
+            shortcut = self._predict_cascade(text, candidate_labels)
+            if shortcut:
+                return shortcut, None, None
+
+        self._ensure_loaded()
+
+        key = None
+        if self.prediction_cache:
+            key = self._prediction_key(text, candidate_labels, HYPOTHESIS_TEMPLATE)
+            cached = self.prediction_cache.get(key)
+            if cached:
+                return cached, None, None
+
+        return None, key, self._encode(text, candidate_labels)
+
+    @instrument(name="nlu_predict_intent_async")
+    async def predict_intent_async(self, text: str, candidate_labels: list[str]):
+        """
+        Versão assíncrona de predict_intent.
+        O load, a cascata, a tokenização e a inferência rodam fora do event loop; com
+        micro-batching, o event loop aguarda o Future do batch sem ocupar uma thread por requisição.
+        """
+        loop = asyncio.get_running_loop()
+
+        if not self.batcher:
+            return await loop.run_in_executor(self.executor, self.predict_intent, text, candidate_labels)
+
+        result, key, encoded = await loop.run_in_executor(self.executor, self._prepare, text, candidate_labels)
+        if result:
+            return result
+
+        probs = await asyncio.wrap_future(self.batcher.submit(encoded))
+
+        result = self._best(probs, candidate_labels)
+        if key:
+            await self.prediction_cache.set_async(key, result)
+        return result
 
+    def _best(self, probs: np.ndarray, candidate_labels: list[str]):
         best_idx = np.argmax(probs)
         return candidate_labels[best_idx], float(probs[best_idx])
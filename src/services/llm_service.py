@@ -1,47 +1,134 @@
 import os
-from google import genai
-from google.genai import types
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
 
+import httpx
+
+from src.services.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
 from src.utils.config import settings
+from src.utils.metrics import metrics
 from src.utils.telemetry import instrument
 
+if TYPE_CHECKING:
+    from google.genai import types
+
+logger = logging.getLogger("llm_service")
+
+FALLBACK_RESPONSE = "Desculpe, tive um problema técnico."
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, falhas de conexão, 429 e 5xx valem nova tentativa; outros 4xx não."""
+    from google.genai import errors
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError, ConnectionError))
+
+def is_response(error: Exception) -> bool:
+    """O upstream respondeu, mesmo que com erro (ex: 400) ou com um stream vazio."""
+    from google.genai import errors
+    return isinstance(error, (errors.APIError, StopAsyncIteration))
+
 class LLMService:
     def __init__(self):
         if not settings.GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY environment variable not set")
-            
-        self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
+
+        # NOTE: google-genai só é importado quando o serviço é criado (import lento e desnecessário com LLM_BACKEND=fake)
+        from google import genai
+        from google.genai import types
+        self._types = types
+
+        # NOTE: conexões HTTP reaproveitadas (keep-alive) em vez de um handshake TLS por chamada
+        limits = httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_CONNECTIONS
+        )
+        self.client = genai.Client(
+            api_key=settings.GEMINI_API_KEY,
+            http_options=types.HttpOptions(
+                base_url=settings.GEMINI_BASE_URL, # NOTE: aponta para um mock local em testes
+                timeout=int(settings.LLM_TIMEOUT_S * 1000),
+                httpx_client=httpx.Client(limits=limits, timeout=settings.LLM_TIMEOUT_S),
+                httpx_async_client=httpx.AsyncClient(limits=limits, timeout=settings.LLM_TIMEOUT_S)
+            )
+        )
         self.model_name = settings.GEMINI_MODEL
+        self.breaker = CircuitBreaker(
+            "llm",
+            failure_threshold=settings.LLM_BREAKER_FAILURES,
+            reset_timeout=settings.LLM_BREAKER_RESET_S
+        )
+        self.caller = ResilientCaller(
+            "llm",
+            timeout=settings.LLM_TIMEOUT_S,
+            deadline=settings.LLM_DEADLINE_S,
+            max_retries=settings.LLM_MAX_RETRIES,
+            backoff=settings.LLM_RETRY_BACKOFF_MS / 1000,
+            breaker=self.breaker,
+            is_retryable=is_retryable,
+            is_response=is_response,
+            hedge=settings.LLM_HEDGE_ENABLED,
+            hedge_delay=settings.LLM_HEDGE_DELAY_MS / 1000 or None
+        )
+        self._contents = OrderedDict() # NOTE: Content já montado por mensagem; o histórico da sessão se repete a cada turno
+        self._contents_size = 4096
+        self._contents_lock = threading.Lock()
+
+    def _content(self, role: str, text: str) -> "types.Content":
+        key = (role, text)
+        with self._contents_lock:
+            content = self._contents.get(key)
+            if content is not None:
+                self._contents.move_to_end(key)
+                return content
+
+        types = self._types
+        content = types.Content(role=role, parts=[types.Part.from_text(text=text)])
+        with self._contents_lock:
+            self._contents[key] = content
+            while len(self._contents) > self._contents_size:
+                self._contents.popitem(last=False)
+        return content
+
+    def _build_contents(self, prompt: str, history: list = None) -> list:
+        contents = [self._content(msg["role"], msg["content"]) for msg in history or [] if msg["role"] != "system"]
+        contents.append(self._content("user", prompt))
+        return contents
+
+    def _build_config(self, history: list = None) -> "types.GenerateContentConfig":
+        """Mensagens `system` do histórico (ex: resumo da conversa) vão para a instrução de sistema."""
+        system = ["Você é um assistente útil."] + [msg["content"] for msg in history or [] if msg["role"] == "system"]
+        return self._types.GenerateContentConfig(
+            system_instruction=[self._types.Part.from_text(text=text) for text in system],
+            temperature=0.7
+        )
+
+    def stats(self) -> dict:
+        snapshot = metrics.snapshot()
+        return {
+            "circuit": self.breaker.stats(),
+            "metrics": {name: data for name, data in snapshot.items() if name.startswith("llm.")},
+        }
 
     @instrument(name="llm_generate")
     def generate_response(self, prompt: str, history: list = None) -> str:
         """
         Gera resposta considerando o histórico.
-        history: Lista de dicts [{'role': 'user', 'content': '...'}, ...]
+        history: Lista de dicts [{'role': 'user', 'content': '...'}, ...]; role 'system' vira instrução de sistema
+        Versão síncrona: uma tentativa, com o timeout HTTP e o circuit breaker.
         """
-        
-        contents = []
-
-        if history:
-            for msg in history:
-                contents.append(
-                    types.Content(
-                        role=msg["role"],
-                        parts=[types.Part.from_text(text=msg["content"])]
-                    )
-                )
+        contents = self._build_contents(prompt, history)
+        config = self._build_config(history)
 
-        contents.append(
-            types.Content(
-                role="user",
-                parts=[types.Part.from_text(text=prompt)]
-            )
-        )
-
-        config = types.GenerateContentConfig(
-            system_instruction=[types.Part.from_text(text="Você é um assistente útil.")],
-            temperature=0.7
-        )
+        probe = self.breaker.acquire()
+        if probe is None:
+            logger.error("Circuito do LLM aberto. Respondendo com a mensagem padrão.")
+            return FALLBACK_RESPONSE
 
         try:
             response = self.client.models.generate_content(
@@ -49,7 +136,76 @@ class LLMService:
                 contents=contents,
                 config=config
             )
+            self.breaker.record_success()
+            return response.text
+        except Exception as e:
+            if is_retryable(e):
+                self.breaker.record_failure()
+            elif is_response(e):
+                self.breaker.record_success() # NOTE: o upstream respondeu (ex: 4xx)
+            logger.error(f"Erro na chamada do LLM: {e}")
+            return FALLBACK_RESPONSE
+        finally:
+            self.breaker.release(probe)
+
+    @instrument(name="llm_generate_async")
+    async def generate_response_async(self, prompt: str, history: list = None) -> str:
+        """
+        Versão assíncrona de generate_response (cliente aio do google-genai), com timeout por
+        tentativa, prazo total, retries com jitter, hedge opcional e circuit breaker.
+        """
+        contents = self._build_contents(prompt, history)
+        config = self._build_config(history)
+
+        try:
+            response = await self.caller.call(
+                lambda: self.client.aio.models.generate_content(
+                    model=self.model_name,
+                    contents=contents,
+                    config=config
+                )
+            )
             return response.text
+        except CircuitOpenError as e:
+            logger.error(f"{e}. Respondendo com a mensagem padrão.")
+            return FALLBACK_RESPONSE
+        except Exception as e:
+            logger.error(f"Erro na chamada do LLM: {type(e).__name__}: {e}")
+            return FALLBACK_RESPONSE
+
+    async def _open_stream(self, contents: list, config: "types.GenerateContentConfig"):
+        """Abre o stream e espera o primeiro trecho (é essa etapa que recebe retry/hedge)."""
+        stream = await self.client.aio.models.generate_content_stream(
+            model=self.model_name,
+            contents=contents,
+            config=config
+        )
+        iterator = stream.__aiter__()
+        first = await iterator.__anext__()
+        return first, iterator
+
+    async def stream_response_async(self, prompt: str, history: list = None):
+        """
+        Gera a resposta em streaming, devolvendo os trechos de texto conforme chegam.
+        A política de retry/hedge vale até o primeiro trecho; depois dele o stream segue sem retry.
+        Se a chamada falhar antes do primeiro trecho, devolve a mensagem de erro padrão.
+        """
+        contents = self._build_contents(prompt, history)
+        config = self._build_config(history)
+
+        try:
+            first, iterator = await self.caller.call(lambda: self._open_stream(contents, config))
+        except Exception as e:
+            logger.error(f"Erro na chamada do LLM (stream): {type(e).__name__}: {e}")
+            yield FALLBACK_RESPONSE
+            return
+
+        try:
+            if first.text:
+                yield first.text
+            async for chunk in iterator:
+                if chunk.text:
+                    yield chunk.text
         except Exception as e:
-            print(f"Erro na chamada do LLM: {e}")
-            return "Desculpe, tive um problema técnico."
+            metrics.counter("llm.stream_errors").inc()
+            logger.error(f"Stream do LLM interrompido: {e}")
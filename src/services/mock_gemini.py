@@ -0,0 +1,70 @@
+import json
+import random
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+def create_app(latency_ms: float, slow_rate: float, slow_ms: float, error_rate: float, token_delay_ms: float,
+               error_status: int = 503) -> FastAPI:
+    """
+    API falsa com o formato do generateContent/streamGenerateContent do Gemini.
+    Injeta latência, cauda lenta (`slow_rate`) e erros (`error_rate`, com status `error_status`: 503 por padrão,
+    400 para um erro não repetível) para exercitar
+    timeouts, retries, hedge e circuit breaker do LLMService (GEMINI_BASE_URL=http://localhost:<porta>).
+    Servido pelo scripts/mock_gemini.py ou numa thread do próprio teste (scripts/check_llm_resilience.py).
+    """
+    app = FastAPI(title="Mock Gemini")
+    app.state.requests = 0
+    # NOTE: em app.state para que testes no mesmo processo mudem o comportamento entre cenários
+    app.state.latency_ms = latency_ms
+    app.state.error_rate = error_rate
+    app.state.error_status = error_status
+
+    async def delay():
+        app.state.requests += 1
+        if random.random() < app.state.error_rate:
+            code = app.state.error_status
+            status = "INVALID_ARGUMENT" if code < 500 else "UNAVAILABLE"
+            return JSONResponse({"error": {"code": code, "message": "mock com erro", "status": status}}, status_code=code)
+        wait = slow_ms if random.random() < slow_rate else app.state.latency_ms
+        await asyncio.sleep(wait / 1000)
+        return None
+
+    def answer(body: dict) -> str:
+        parts = body.get("contents", [{}])[-1].get("parts", [{}])
+        return f"Resposta do mock para: {parts[0].get('text', '')[-80:]}"
+
+    def payload(text: str, finish: bool) -> dict:
+        candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+        if finish:
+            candidate["finishReason"] = "STOP"
+        return {"candidates": [candidate], "usageMetadata": {"promptTokenCount": 1, "candidatesTokenCount": 1}}
+
+    @app.post("/{version}/models/{model}:generateContent")
+    async def generate_content(version: str, model: str, request: Request):
+        error = await delay()
+        if error:
+            return error
+        return payload(answer(await request.json()), finish=True)
+
+    @app.post("/{version}/models/{model}:streamGenerateContent")
+    async def stream_generate_content(version: str, model: str, request: Request):
+        error = await delay()
+        if error:
+            return error
+        words = answer(await request.json()).split(" ")
+
+        async def events():
+            for i, word in enumerate(words):
+                text = word if i == 0 else " " + word
+                yield f"data: {json.dumps(payload(text, finish=i == len(words) - 1))}\r\n\r\n"
+                await asyncio.sleep(token_delay_ms / 1000)
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    def stats():
+        return {"requests": app.state.requests}
+
+    return app
@@ -1,10 +1,17 @@
 import os
+import json
+import time
+import zipfile
 import shutil
+import hashlib
 import logging
+import tempfile
+import numpy as np
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from huggingface_hub import snapshot_download
 
-from src.utils.storage import LocalStorage
+from src.utils.storage import LocalStorage, ArtifactStore, file_sha256
 from src.utils.config import settings
 
 logger = logging.getLogger("builder")
@@ -16,15 +23,185 @@ class ModelBuilder:
         "special_tokens_map.json", "added_tokens.json"
     ]
 
-    CACHE_DIR = Path("/tmp/hf_cache")
-    STAGING_DIR = Path("/tmp/staging")
+    CACHE_DIR = Path(settings.HF_CACHE_DIR)
+    STAGING_ROOT = Path(settings.BUILD_STAGING_ROOT)
 
-    def __init__(self, model_id: str, artifact_name: str):
+    REPORT_FILE = "quantization_report.json"
+    BUILD_FORMAT = 3 # NOTE: incrementar quando o empacotamento mudar, força rebuild de tudo
+
+    def __init__(self, model_id: str, artifact_name: str, quantize: bool = False, eval_set: str = None):
+        """
+        quantize: Gera também a variante INT8 (model.int8.onnx) por quantização dinâmica
+        eval_set: JSONL com {"text", "intent"} usado para comparar as variantes FP32 e INT8
+        """
         self.model_id = model_id
         self.artifact_name = artifact_name
+        self.quantize = quantize
+        self.eval_set = eval_set or settings.INTENT_EVAL_SET
         self.storage = LocalStorage(base_path=settings.ARTIFACTS_PATH)
+        self.store = ArtifactStore(self.storage, cache_dir="/tmp/artifact_cache")
+        self.staging_dir = None # NOTE: um diretório por build, builds simultâneos não se sobrescrevem
+        self.version = None
+        self.skipped = False
+
+    def _pick_onnx(self, onnx_files: list[Path]) -> Path:
+        """Prefere o model.onnx original aos variantes já quantizados do repositório."""
+        for onnx_file in onnx_files:
+            if onnx_file.name == "model.onnx":
+                return onnx_file
+        return onnx_files[0]
+
+    def _quantize(self):
+        """Quantização dinâmica dos pesos para INT8 (ativações continuam em FP32)."""
+        try:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+        except ImportError as e:
+            raise RuntimeError(f"Quantização requer o pacote 'onnx' instalado: {e}")
+
+        logger.info("Quantizando modelo para INT8...")
+        quantize_dynamic(
+            model_input=self.staging_dir / "model.onnx",
+            model_output=self.staging_dir / "model.int8.onnx",
+            weight_type=QuantType.QInt8
+        )
 
-    def run(self) -> bool:
+    def _externalize_weights(self):
+        """
+        Move os pesos de cada .onnx para um arquivo `<modelo>.data` ao lado do grafo.
+        O ONNX Runtime mapeia esse arquivo em memória, então workers que carregam o mesmo
+        artefato compartilham as páginas dos pesos pelo page cache.
+        """
+        try:
+            import onnx
+        except ImportError as e:
+            # NOTE: sem fallback silencioso; o manifest do build registra external_weights=True
+            raise RuntimeError(f"NLU_EXTERNAL_WEIGHTS requer o pacote 'onnx' instalado: {e}")
+
+        for onnx_file in sorted(self.staging_dir.glob("*.onnx")):
+            model = onnx.load(str(onnx_file))
+            onnx.save_model(
+                model,
+                str(onnx_file),
+                save_as_external_data=True,
+                all_tensors_to_one_file=True,
+                location=f"{onnx_file.name}.data",
+                size_threshold=1024
+            )
+            logger.info(f"Pesos de {onnx_file.name} movidos para {onnx_file.name}.data")
+
+    def _make_zip(self, zip_name: str) -> str:
+        """Zip sem compressão (ZIP_STORED): os pesos quase não comprimem e a extração vira cópia sequencial."""
+        zip_path = f"{self.staging_dir}.zip"
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_STORED) as zip_ref:
+            for path in sorted(self.staging_dir.iterdir()):
+                zip_ref.write(path, arcname=path.name)
+        return zip_path
+
+    def _load_eval_set(self) -> list[dict]:
+        if not self.eval_set or not os.path.exists(self.eval_set):
+            logger.warning(f"Conjunto de avaliação {self.eval_set} não encontrado. Pulando relatório.")
+            return []
+
+        with open(self.eval_set, "r") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _evaluate_variant(self, variant: str, samples: list[dict], labels: list[str]) -> dict:
+        from src.services.intent_service import IntentService
+
+        service = IntentService(
+            artifact_name=self.staging_dir.name,
+            runtime_dir=str(self.staging_dir.parent),
+            model_variant=variant,
+            batching=False,
+            cascade=False
+        )
+        service.save_optimized = False
+        service.prediction_cache = None # NOTE: a latência do relatório tem que medir o modelo
+        service.register_labels(labels)
+        service.predict_intent(samples[0]["text"], labels) # NOTE: warm-up fora da medição
+
+        predictions = []
+        latencies = []
+        for sample in samples:
+            start = time.perf_counter()
+            predicted, _ = service.predict_intent(sample["text"], labels)
+            latencies.append((time.perf_counter() - start) * 1000)
+            predictions.append(predicted)
+
+        correct = sum(p == s["intent"] for p, s in zip(predictions, samples))
+        model_file = self.staging_dir / ("model.onnx" if variant == "fp32" else "model.int8.onnx")
+
+        return {
+            "predictions": predictions,
+            "accuracy": correct / len(samples),
+            "latency_ms": {
+                "p50": float(np.percentile(latencies, 50)),
+                "p95": float(np.percentile(latencies, 95)),
+            },
+            "size_bytes": model_file.stat().st_size,
+        }
+
+    def _write_report(self) -> Path:
+        """Compara FP32 e INT8 no conjunto de avaliação e grava o relatório no staging."""
+        samples = self._load_eval_set()
+        if not samples:
+            return None
+
+        labels = list(dict.fromkeys(s["intent"] for s in samples))
+        results = {variant: self._evaluate_variant(variant, samples, labels) for variant in ("fp32", "int8")}
+
+        fp32_preds = results["fp32"].pop("predictions")
+        int8_preds = results["int8"].pop("predictions")
+        agreement = sum(a == b for a, b in zip(fp32_preds, int8_preds)) / len(samples)
+
+        report = {
+            "model_id": self.model_id,
+            "eval_set": self.eval_set,
+            "samples": len(samples),
+            "labels": labels,
+            "agreement_rate": agreement,
+            "variants": results,
+        }
+
+        report_path = self.staging_dir / self.REPORT_FILE
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+        logger.info(
+            f"INT8 vs FP32: concordância {agreement:.1%}, "
+            f"p50 {results['int8']['latency_ms']['p50']:.1f}ms vs {results['fp32']['latency_ms']['p50']:.1f}ms, "
+            f"tamanho {results['int8']['size_bytes'] / 1e6:.1f}MB vs {results['fp32']['size_bytes'] / 1e6:.1f}MB"
+        )
+        return report_path
+
+    def _fingerprint(self, clone_path: Path, onnx_file: Path) -> str:
+        """Hash das entradas do build (arquivos do snapshot usados + opções) para detectar builds repetidos."""
+        inputs = {
+            "format": self.BUILD_FORMAT,
+            "model_id": self.model_id,
+            "quantize": self.quantize,
+            "external_weights": settings.NLU_EXTERNAL_WEIGHTS,
+            "onnx": file_sha256(str(onnx_file)),
+            "files": {
+                name: file_sha256(str(clone_path / name))
+                for name in self.CONFIG_FILES if (clone_path / name).exists()
+            },
+        }
+        if self.quantize and self.eval_set and os.path.exists(self.eval_set):
+            inputs["eval_set"] = file_sha256(self.eval_set)
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+    def _is_up_to_date(self, artifact: str, fingerprint: str) -> bool:
+        if not self.store.is_complete(artifact):
+            return False
+        published = self.store.manifest(artifact)["metadata"].get("fingerprint")
+        return published == fingerprint and self.storage.exists(self.artifact_name)
+
+    def run(self, force: bool = False) -> bool:
+        """
+        Baixa, empacota e publica o modelo. Sem `force`, pula o build quando as entradas
+        (snapshot e opções) são as mesmas da versão já publicada.
+        """
         try:
             logger.info(f"Baixando snapshot de {self.model_id}...")
             clone_dir = snapshot_download(
@@ -35,33 +212,51 @@ class ModelBuilder:
             )
             clone_path = Path(clone_dir)
 
-            if self.STAGING_DIR.exists():
-                logger.info(f"Limpando {self.STAGING_DIR}...")
-                shutil.rmtree(self.STAGING_DIR)
-            else:
-                logger.info(f"Criando {self.STAGING_DIR}...")
+            onnx_files = list(clone_path.glob('**/*.onnx'))
+            if not onnx_files:
+                logger.error("Nenhum .onnx encontrado!")
+                raise FileNotFoundError("Nenhum .onnx encontrado!")
+            onnx_file = self._pick_onnx(onnx_files)
 
-            self.STAGING_DIR.mkdir(parents=True)
+            zip_name = self.artifact_name.replace(".zip", "")
+            fingerprint = self._fingerprint(clone_path, onnx_file)
+            if not force and self._is_up_to_date(zip_name, fingerprint):
+                self.version = self.store.current_version(zip_name)
+                self.skipped = True
+                logger.info(f"{zip_name}@{self.version} já está atualizado. Pulando build.")
+                return True
+
+            self.STAGING_ROOT.mkdir(parents=True, exist_ok=True)
+            self.staging_dir = Path(tempfile.mkdtemp(prefix=f"{zip_name}-", dir=self.STAGING_ROOT))
+            logger.info(f"Criando {self.staging_dir}...")
 
             for filename in self.CONFIG_FILES:
                 src = clone_path / filename
                 if src.exists():
-                    logger.info(f"Copiando {src} para {self.STAGING_DIR}")
-                    shutil.copy(src, self.STAGING_DIR)
+                    logger.info(f"Copiando {src} para {self.staging_dir}")
+                    shutil.copy(src, self.staging_dir)
                 else:
                     logger.warning(f"Arquivo {src} não encontrado!")
 
-            onnx_files = list(clone_path.glob('**/*.onnx'))
-            if not onnx_files:
-                logger.error("Nenhum .onnx encontrado!")
-                raise FileNotFoundError("Nenhum .onnx encontrado!")
+            shutil.copy(onnx_file, self.staging_dir / "model.onnx")
 
-            shutil.copy(onnx_files[0], self.STAGING_DIR / "model.onnx")
+            report_path = None
+            if self.quantize:
+                self._quantize()
+                report_path = self._write_report()
 
-            zip_name = self.artifact_name.replace(".zip", "")
-            zip_path = shutil.make_archive(f"/tmp/{zip_name}", 'zip', self.STAGING_DIR)
+            if settings.NLU_EXTERNAL_WEIGHTS:
+                self._externalize_weights()
+
+            zip_path = self._make_zip(zip_name)
 
             self.storage.upload(zip_path, self.artifact_name)
+            # NOTE: storage endereçado por conteúdo; só os arquivos que mudaram são enviados
+            self.version = self.store.publish(
+                str(self.staging_dir), zip_name, metadata={"model_id": self.model_id, "fingerprint": fingerprint}
+            )
+            if report_path:
+                self.storage.upload(str(report_path), f"{zip_name}.{self.REPORT_FILE}")
             
             logger.info(f"Sucesso! Artefato {self.artifact_name} criado.")
             return True
@@ -69,6 +264,53 @@ class ModelBuilder:
             logger.error(f"Erro: {e}")
             return False
         finally:
-            if self.STAGING_DIR.exists():
-                logger.info(f"Limpando {self.STAGING_DIR}...")
-                shutil.rmtree(self.STAGING_DIR)
+            if self.staging_dir and self.staging_dir.exists():
+                logger.info(f"Limpando {self.staging_dir}...")
+                shutil.rmtree(self.staging_dir)
+                Path(f"{self.staging_dir}.zip").unlink(missing_ok=True)
+
+def _build_entry(entry: dict, force: bool) -> dict:
+    """Executado em um processo do pool: um ModelBuilder por entrada do manifest."""
+    builder = ModelBuilder(
+        model_id=entry["model"],
+        artifact_name=entry["name"],
+        quantize=entry.get("quantize", False),
+        eval_set=entry.get("eval_set")
+    )
+    start = time.perf_counter()
+    ok = builder.run(force=force)
+    return {
+        "name": entry["name"],
+        "ok": ok,
+        "skipped": builder.skipped,
+        "version": builder.version,
+        "seconds": time.perf_counter() - start,
+    }
+
+def load_build_manifest(path: str) -> list[dict]:
+    """Lê o manifest de build: lista JSON de {"model", "name", "quantize"?, "eval_set"?}."""
+    with open(path, "r") as f:
+        entries = json.load(f)
+
+    names = [entry["name"] for entry in entries]
+    duplicated = {name for name in names if names.count(name) > 1}
+    if duplicated:
+        raise ValueError(f"Artefatos repetidos no manifest: {sorted(duplicated)}")
+    return entries
+
+def build_all(entries: list[dict], workers: int = None, force: bool = False) -> list[dict]:
+    """
+    Builda os modelos do manifest em paralelo, um processo por modelo (download, quantização
+    e zip não disputam o GIL). Os processos compartilham o cache do HuggingFace.
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(entries)))
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_build_entry, entry, force): entry for entry in entries}
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"Build de {futures[future]['name']} falhou: {e}")
+                results.append({"name": futures[future]["name"], "ok": False, "skipped": False, "version": None})
+    return results
@@ -0,0 +1,257 @@
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+from src.utils.config import settings
+from src.utils.metrics import metrics
+
+logger = logging.getLogger("model_registry")
+
+class _Slot:
+    """Uma instância carregada de um modelo, com as requisições em voo (leases) que a usam."""
+    def __init__(self, name: str, engine, load_ms: float):
+        self.name = name
+        self.engine = engine
+        self.version = engine.artifact_version
+        self.memory = engine.memory_estimate()
+        self.load_ms = load_ms
+        self.last_used = time.monotonic()
+        self.leases = 0
+        self.retired = False
+        self.drain_expired = False # NOTE: a última lease descarrega a instância
+
+
+class ModelRegistry:
+    """
+    Vários NLUEngine carregados ao mesmo tempo (ex: classificadores por idioma, NER), por nome.
+
+    - register(name, factory, prepare): `factory` cria uma instância nova do engine;
+      `prepare(engine)` carrega e aquece (padrão: só carrega).
+    - lease(name): uso do modelo durante uma requisição; carrega sob demanda.
+    - swap(name): hot-swap sem downtime. A versão nova é carregada e aquecida ao lado da atual,
+      troca atômica no registro, espera as requisições da antiga terminarem (drain), a descarrega
+      e apaga os arquivos da versão antiga (NLUEngine.remove_artifacts).
+    - Orçamento de memória (Settings.NLU_MODEL_MEMORY_BUDGET_MB): acima dele, os modelos ociosos
+      menos usados recentemente são descarregados (voltam a carregar no próximo uso). A checagem
+      roda a cada load, swap e quando a última lease de um modelo termina.
+    """
+    def __init__(self, memory_budget_mb: float = None, drain_timeout: float = None):
+        budget = settings.NLU_MODEL_MEMORY_BUDGET_MB if memory_budget_mb is None else memory_budget_mb
+        self.memory_budget = int(budget * 1024 * 1024) # NOTE: 0 = sem limite
+        self.drain_timeout = settings.NLU_MODEL_DRAIN_TIMEOUT_S if drain_timeout is None else drain_timeout
+        self._factories = {}
+        self._active = {}
+        self._retiring = []
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._name_locks = {}
+        self._stats = {"loads": 0, "swaps": 0, "evictions": 0}
+
+    def register(self, name: str, factory, prepare=None):
+        self._factories[name] = (factory, prepare or (lambda engine: engine._ensure_loaded()))
+        self._name_locks[name] = threading.Lock()
+
+    def names(self) -> list[str]:
+        return list(self._factories)
+
+    def peek(self, name: str):
+        """Engine ativo, sem carregar nem marcar uso (None se não estiver carregado)."""
+        slot = self._active.get(name)
+        return slot.engine if slot else None
+
+    def _build(self, name: str) -> _Slot:
+        if name not in self._factories:
+            raise KeyError(f"Modelo não registrado: {name}")
+        factory, prepare = self._factories[name]
+
+        start = time.perf_counter()
+        engine = factory()
+        prepare(engine)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        metrics.histogram("models.load_ms").observe(load_ms)
+        with self._lock:
+            self._stats["loads"] += 1
+        logger.info(f"Modelo {name}@{engine.artifact_version} pronto em {load_ms:.0f}ms.")
+        return _Slot(name, engine, load_ms)
+
+    def get(self, name: str):
+        """Engine ativo de `name`, carregando (e aquecendo) se preciso. Bloqueante."""
+        slot = self._active.get(name)
+        if slot is None:
+            with self._name_locks.setdefault(name, threading.Lock()):
+                slot = self._active.get(name)
+                if slot is None:
+                    slot = self._build(name)
+                    with self._lock:
+                        self._active[name] = slot
+                    self._evict(keep=name)
+        slot.last_used = time.monotonic()
+        return slot.engine
+
+    @contextmanager
+    def lease(self, name: str):
+        """Usa o engine durante o bloco; um swap ou eviction não o descarrega enquanto houver lease."""
+        while True:
+            self.get(name)
+            with self._lock:
+                slot = self._active.get(name)
+                if slot is not None:
+                    slot.leases += 1
+                    slot.last_used = time.monotonic()
+                    break
+        try:
+            yield slot.engine
+        finally:
+            with self._lock:
+                slot.leases -= 1
+                idle = slot.leases == 0
+                release = slot.drain_expired and idle
+                if release:
+                    self._retiring.remove(slot)
+                if idle:
+                    self._drained.notify_all()
+            if release:
+                logger.info(f"Última requisição de {slot.name}@{slot.version} terminou; descarregando.")
+                self._unload(slot)
+            elif idle:
+                # NOTE: um modelo acima do orçamento que estava em uso só pode ser descarregado agora
+                self._evict()
+
+    @asynccontextmanager
+    async def lease_async(self, name: str):
+        """Como lease, mas o carregamento (se houver) roda no executor, fora do event loop."""
+        if name not in self._active:
+            await asyncio.get_running_loop().run_in_executor(None, self.get, name)
+        with self.lease(name) as engine:
+            yield engine
+
+    def _retire(self, slot: _Slot):
+        """
+        Espera as leases da instância antiga terminarem e a descarrega. Se o drain expirar, nunca
+        descarrega com requisições em voo: a descarga fica para quando a última lease terminar.
+        """
+        deadline = time.monotonic() + self.drain_timeout
+        with self._lock:
+            slot.retired = True
+            self._retiring.append(slot)
+            while slot.leases > 0 and time.monotonic() < deadline:
+                self._drained.wait(timeout=max(0.0, deadline - time.monotonic()))
+            pending = slot.leases
+            if pending:
+                slot.drain_expired = True
+            else:
+                self._retiring.remove(slot)
+        if pending:
+            logger.warning(
+                f"Drain de {slot.name}@{slot.version} expirou com {pending} requisições em voo; "
+                f"descarrega quando a última terminar."
+            )
+            return
+        self._unload(slot)
+
+    def _unload(self, slot: _Slot):
+        slot.engine.unload()
+        if not slot.retired:
+            return # NOTE: eviction; a mesma versão volta a carregar no próximo uso
+        with self._lock:
+            in_use = any(
+                other.engine.local_model_path == slot.engine.local_model_path
+                for other in list(self._active.values()) + self._retiring
+            )
+        if not in_use:
+            try:
+                slot.engine.remove_artifacts()
+            except Exception as e:
+                logger.warning(f"Falha ao remover os arquivos de {slot.name}@{slot.version}: {e}")
+
+    def swap(self, name: str) -> dict:
+        """
+        Carrega a versão atual do artefato numa instância nova e troca sem downtime.
+        Bloqueante (carga + drain); chame no executor ou numa thread.
+        """
+        with self._name_locks.setdefault(name, threading.Lock()):
+            new = self._build(name)
+            with self._lock:
+                old = self._active.get(name)
+                self._active[name] = new
+                self._stats["swaps"] += 1
+
+            result = {"name": name, "version": new.version, "previous": old.version if old else None, "load_ms": new.load_ms}
+            logger.info(f"Hot-swap de {name}: {result['previous']} -> {new.version}")
+            if old is not None:
+                self._retire(old)
+        self._evict(keep=name)
+        metrics.counter("models.swaps").inc()
+        return result
+
+    def check_updates(self) -> list[dict]:
+        """Faz swap dos modelos carregados cujo artefato publicado mudou de versão."""
+        swapped = []
+        for name, slot in list(self._active.items()):
+            try:
+                if slot.engine.available_version() != slot.version:
+                    swapped.append(self.swap(name))
+            except Exception as e:
+                logger.error(f"Falha ao atualizar o modelo {name}: {e}")
+        return swapped
+
+    def unload(self, name: str) -> bool:
+        """Tira o modelo do registro e o descarrega depois do drain."""
+        with self._lock:
+            slot = self._active.pop(name, None)
+        if slot is None:
+            return False
+        self._retire(slot)
+        return True
+
+    def memory_used(self) -> int:
+        return sum(slot.memory for slot in list(self._active.values()) + list(self._retiring))
+
+    def _evict(self, keep: str = None):
+        """Descarrega os modelos ociosos menos usados até caber no orçamento."""
+        if not self.memory_budget:
+            return
+        while True:
+            with self._lock:
+                if self.memory_used() <= self.memory_budget:
+                    return
+                idle = [slot for name, slot in self._active.items() if name != keep and slot.leases == 0]
+                if not idle:
+                    logger.warning(
+                        f"Modelos acima do orçamento ({self.memory_used() / 2**20:.0f}MB > "
+                        f"{self.memory_budget / 2**20:.0f}MB), mas nenhum está ocioso."
+                    )
+                    return
+                victim = min(idle, key=lambda slot: slot.last_used)
+                del self._active[victim.name]
+                self._stats["evictions"] += 1
+
+            metrics.counter("models.evictions").inc()
+            logger.info(f"Descarregando {victim.name}@{victim.version} (LRU, orçamento de memória).")
+            self._unload(victim)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            models = {
+                name: {
+                    "version": slot.version,
+                    "memory_mb": slot.memory / 2**20,
+                    "leases": slot.leases,
+                    "idle_s": now - slot.last_used,
+                    "load_ms": slot.load_ms,
+                }
+                for name, slot in self._active.items()
+            }
+            stats = dict(self._stats)
+        return {
+            **stats,
+            "registered": self.names(),
+            "models": models,
+            "retiring": len(self._retiring),
+            "memory_mb": self.memory_used() / 2**20,
+            "budget_mb": self.memory_budget / 2**20 if self.memory_budget else None,
+        }
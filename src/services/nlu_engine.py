@@ -1,65 +1,489 @@
 import os
+import time
+import queue
+import shutil
 import zipfile
 import json
 import logging
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
 import numpy as np
-import onnxruntime as ort
 from tokenizers import Tokenizer
 
-from src.utils.storage import LocalStorage
+from src.services.prediction_cache import PredictionCache
+from src.utils.storage import LocalStorage, ArtifactStore
 from src.utils.config import settings
+from src.utils.metrics import metrics, timed
 from src.utils.telemetry import instrument
+from src.utils.text import normalize_text
+
+if TYPE_CHECKING:
+    import onnxruntime as ort
 
 logger = logging.getLogger("nlu_engine")
 
+# NOTE: intra_op_num_threads = 0 deixa o ONNX Runtime usar um thread por núcleo físico
+SESSION_PROFILES = {
+    "latency": {
+        "graph_optimization_level": "all",
+        "intra_op_num_threads": 0,
+        "inter_op_num_threads": 1,
+        "execution_mode": "sequential",
+        "enable_cpu_mem_arena": True,
+        "enable_mem_pattern": True,
+    },
+    "throughput": {
+        "graph_optimization_level": "all",
+        "intra_op_num_threads": 1,
+        "inter_op_num_threads": 1,
+        "execution_mode": "sequential",
+        "enable_cpu_mem_arena": True,
+        "enable_mem_pattern": True,
+    },
+    "low_memory": {
+        "graph_optimization_level": "basic",
+        "intra_op_num_threads": 1,
+        "inter_op_num_threads": 1,
+        "execution_mode": "sequential",
+        "enable_cpu_mem_arena": False,
+        "enable_mem_pattern": False,
+    },
+}
+
+# NOTE: nomes dos enums do onnxruntime, resolvidos só ao criar a sessão (o import é adiado)
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+
+MODEL_VARIANTS = {
+    "fp32": "model.onnx",
+    "int8": "model.int8.onnx",
+}
+
+EXECUTION_MODES = {
+    "sequential": "ORT_SEQUENTIAL",
+    "parallel": "ORT_PARALLEL",
+}
+
+def estimate_tokens(texts: list[str]) -> list[int]:
+    """Estimativa sem tokenizer (~4 caracteres por token)."""
+    return [max(1, len(text) // 4) for text in texts]
+
+def import_ort():
+    """onnxruntime é importado na primeira sessão criada, não no import do módulo (custa centenas de ms)."""
+    import onnxruntime
+    return onnxruntime
+
+class InferenceBusyError(RuntimeError):
+    """Fila de inferência saturada. O chamador deve aplicar backpressure (ex: HTTP 503)."""
+
+
+class SessionPool:
+    """
+    Pool limitado de sessões ONNX. Cada sessão guarda sua própria cópia dos pesos,
+    então o tamanho do pool troca memória por requisições simultâneas.
+    Quando `max_waiting` chamadores já aguardam uma sessão (ou o timeout expira),
+    novas requisições são rejeitadas com InferenceBusyError.
+    """
+    def __init__(self, sessions: list, max_waiting: int = 64, acquire_timeout: float = 5.0):
+        self.size = len(sessions)
+        self.max_waiting = max_waiting
+        self.acquire_timeout = acquire_timeout
+        self._free = queue.Queue()
+        for session in sessions:
+            self._free.put(session)
+
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_use = 0
+        self._stats = {"acquired": 0, "rejected": 0, "max_waiting": 0}
+
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            if self._waiting >= self.max_waiting:
+                self._stats["rejected"] += 1
+                raise InferenceBusyError(f"{self._waiting} requisições aguardando uma sessão de inferência")
+            self._waiting += 1
+            self._stats["max_waiting"] = max(self._stats["max_waiting"], self._waiting)
+
+        try:
+            session = self._free.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise InferenceBusyError(f"Nenhuma sessão livre após {self.acquire_timeout}s")
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        with self._lock:
+            self._in_use += 1
+            self._stats["acquired"] += 1
+        try:
+            yield session
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._free.put(session)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": self.size, "in_use": self._in_use, "waiting": self._waiting, **self._stats}
+
+
 class NLUEngine:
-    def __init__(self, artifact_name: str, runtime_dir: str = "/app/models/served"):
+    def __init__(self, artifact_name: str, runtime_dir: str = "/app/models/served", model_variant: str = None):
         """
         artifact_name: Nome do arquivo .zip (ex: intent_classifier.zip)
         runtime_dir: Onde o modelo será descompactado para rodar (Efêmero)
+        model_variant: Variante do modelo no artefato (fp32 ou int8). Padrão: Settings.NLU_MODEL_VARIANT
         """
         self.artifact_name = artifact_name
+        self.model_variant = model_variant or settings.NLU_MODEL_VARIANT
         self.storage = LocalStorage(base_path=settings.ARTIFACTS_PATH)
         self.runtime_dir = runtime_dir
         self.local_model_path = os.path.join(self.runtime_dir, artifact_name.replace(".zip", ""))
+        self.cache_dir = self.local_model_path # NOTE: onde ficam os grafos otimizados (sempre no runtime dir)
+        self.store = ArtifactStore(self.storage, cache_dir=self.runtime_dir)
+        self.artifact_version = "local"
         self.session = None
+        self.sessions = []
+        self.pool = None
         self.tokenizer = None
+        self.onnx_path = None
+        self._counting_tokenizer = None
+        self.pool_size = max(1, settings.NLU_SESSION_POOL_SIZE)
+        self.session_profile = settings.NLU_SESSION_PROFILE
+        self.save_optimized = settings.NLU_SAVE_OPTIMIZED_MODEL
+        self.length_buckets = sorted(settings.NLU_LENGTH_BUCKETS)
+        self.padding_stats = {"batches": 0, "tokens": 0, "padding": 0, "last_ratio": 0.0}
+        self.load_timings = {} # NOTE: duração de cada fase do load (ms), exposta no /health/ready
+        self.prediction_cache = None
+        if settings.INTENT_CACHE_ENABLED:
+            self.prediction_cache = PredictionCache(
+                max_entries=settings.INTENT_CACHE_MAX_ENTRIES,
+                ttl=settings.INTENT_CACHE_TTL,
+                use_redis=settings.INTENT_CACHE_REDIS
+            )
+        self._stats_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _checkout_from_store(self) -> bool:
+        """
+        Se o artefato estiver publicado no storage endereçado por conteúdo, materializa a versão
+        atual em runtime_dir/<artefato>/<versão> (hardlinks, só os blobs novos são baixados)
+        e carrega direto de lá, sem extração.
+        """
+        artifact = self.artifact_name.replace(".zip", "")
+        if self.store.current_version(artifact) is None:
+            return False
+
+        version_dir, manifest = self.store.checkout(artifact, os.path.join(self.runtime_dir, artifact))
+        self.local_model_path = version_dir
+        self.cache_dir = version_dir
+        self.artifact_version = manifest["version"]
+        return True
+
+    def _zip_version(self) -> str:
+        stat = os.stat(self.storage.path(self.artifact_name))
+        return f"zip-{stat.st_size}-{int(stat.st_mtime)}"
 
     def _load_artifacts(self):
-        """Baixa do storage e descompacta no runtime dir."""
-        if os.path.exists(os.path.join(self.local_model_path, "model.onnx")):
-            return 
+        """
+        Usa o storage endereçado por conteúdo quando possível; senão baixa o .zip e descompacta em
+        runtime_dir/<artefato>/<versão do zip>. Sem o .zip no storage, usa os arquivos já extraídos.
+        """
+        if self._checkout_from_store():
+            return
+
+        if not self.storage.exists(self.artifact_name) and os.path.exists(os.path.join(self.local_model_path, "model.onnx")):
+            return
+
+        # NOTE: um diretório por versão: um zip novo não sobrescreve arquivos que outra instância
+        # ainda tem abertos (ou mapeados em memória) durante o hot-swap
+        self.artifact_version = self._zip_version()
+        version_dir = os.path.join(self.local_model_path, self.artifact_version)
+        self.local_model_path = version_dir
+        self.cache_dir = version_dir
+        if os.path.exists(os.path.join(version_dir, "model.onnx")):
+            return
 
-        logger.info(f"Instalando modelo {self.artifact_name} em {self.local_model_path}...")
+        logger.info(f"Instalando modelo {self.artifact_name} em {version_dir}...")
 
         zip_local_path = f"/tmp/{self.artifact_name}"
+        tmp_dir = f"{version_dir}.tmp-{os.getpid()}"
 
         self.storage.download(self.artifact_name, zip_local_path)
-        
-        os.makedirs(self.local_model_path, exist_ok=True)
 
         try:
             with zipfile.ZipFile(zip_local_path, 'r') as zip_ref:
-                zip_ref.extractall(self.local_model_path)
+                zip_ref.extractall(tmp_dir)
+            os.replace(tmp_dir, version_dir)
         finally:
             if os.path.exists(zip_local_path):
                 os.remove(zip_local_path)
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def available_version(self) -> str:
+        """Versão que um load agora usaria; diferente de artifact_version quando há artefato novo publicado."""
+        version = self.store.current_version(self.artifact_name.replace(".zip", ""))
+        if version:
+            return version
+        if self.storage.exists(self.artifact_name):
+            return self._zip_version()
+        return "local"
 
     @instrument(name="load_model")
     def load(self):
+        start = time.perf_counter()
         self._load_artifacts()
+        self.load_timings["artifacts_ms"] = (time.perf_counter() - start) * 1000
 
+        start = time.perf_counter()
         tok_path = os.path.join(self.local_model_path, "tokenizer.json")
         self.tokenizer = Tokenizer.from_file(tok_path)
+        self.load_timings["tokenizer_ms"] = (time.perf_counter() - start) * 1000
 
-        sess_options = ort.SessionOptions()
-        sess_options.intra_op_num_threads = 1 
-        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
-        
-        onnx_path = os.path.join(self.local_model_path, "model.onnx")
-        self.session = ort.InferenceSession(onnx_path, sess_options)
+        onnx_path = os.path.join(self.local_model_path, MODEL_VARIANTS[self.model_variant])
+        if not os.path.exists(onnx_path):
+            logger.warning(f"Variante {self.model_variant} não existe em {self.artifact_name}. Usando fp32.")
+            onnx_path = os.path.join(self.local_model_path, MODEL_VARIANTS["fp32"])
+
+        start = time.perf_counter()
+        self.onnx_path = onnx_path
+        sessions = [self._create_session(onnx_path) for _ in range(self.pool_size)]
+        self.load_timings["sessions_ms"] = (time.perf_counter() - start) * 1000
+
+        self._configure_tokenizer()
+        self.pool = SessionPool(
+            sessions,
+            max_waiting=settings.NLU_POOL_MAX_WAITING,
+            acquire_timeout=settings.NLU_POOL_ACQUIRE_TIMEOUT
+        )
+        self.sessions = sessions
+        # NOTE: por último; `session` é o sinal de "carregado" que _ensure_loaded lê sem lock
+        self.session = sessions[0]
         
-        logger.info(f"Modelo {self.artifact_name} carregado na memória.")
+        logger.info(
+            f"Modelo {self.artifact_name} carregado na memória "
+            f"(variante {self.model_variant}, perfil {self.session_profile}, {self.pool_size} sessões)."
+        )
+
+    def _configure_tokenizer(self):
+        """Ajustes do tokenizer (truncation, padding) feitos no load, antes de publicar a sessão."""
+
+    def memory_estimate(self) -> int:
+        """Bytes estimados do modelo carregado: pesos (uma cópia por sessão do pool) + tokenizer."""
+        if not self.session:
+            return 0
+        weights = sum(
+            os.path.getsize(path) for path in (self.onnx_path, f"{self.onnx_path}.data") if os.path.exists(path)
+        )
+        tokenizer = os.path.getsize(os.path.join(self.local_model_path, "tokenizer.json"))
+        return weights * len(self.sessions) + tokenizer
+
+    def unload(self):
+        """Libera sessões e tokenizer. O ModelRegistry só chama depois do drain (sem requisições em voo)."""
+        with self._load_lock:
+            self.session = None
+            self.sessions = []
+            self.pool = None
+            self.tokenizer = None
+            self._counting_tokenizer = None
+        logger.info(f"Modelo {self.artifact_name}@{self.artifact_version} descarregado.")
+
+    def remove_artifacts(self) -> bool:
+        """
+        Apaga o diretório desta versão (runtime_dir/<artefato>/<versão>) depois do unload, se já houver
+        outra versão publicada. A versão atual fica (o próximo load a reaproveita), assim como o
+        diretório "local". Outro processo que ainda use a versão antiga mantém os arquivos abertos
+        ou mapeados (no POSIX o unlink não os invalida), e o próximo load dele já usa a versão nova.
+        Os blobs que só essa versão usava saem do cache (ArtifactStore.prune_cache).
+        """
+        if self.session is not None or self.artifact_version == "local":
+            return False
+        if self.available_version() == self.artifact_version:
+            return False
+        shutil.rmtree(self.local_model_path, ignore_errors=True)
+        logger.info(f"Diretório da versão {self.artifact_version} removido ({self.local_model_path}).")
+        self.store.prune_cache()
+        return True
+
+    def _ensure_loaded(self):
+        if self.session:
+            return
+        with self._load_lock:
+            if not self.session:
+                self.load()
+
+    def _session_options(self, profile: dict) -> "ort.SessionOptions":
+        ort = import_ort()
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = getattr(
+            ort.GraphOptimizationLevel, GRAPH_OPTIMIZATION_LEVELS[profile["graph_optimization_level"]]
+        )
+        sess_options.intra_op_num_threads = profile["intra_op_num_threads"]
+        if profile["intra_op_num_threads"] == 0 and self.pool_size > 1:
+            # NOTE: divide os núcleos entre as sessões do pool para não haver oversubscription
+            sess_options.intra_op_num_threads = max(1, (os.cpu_count() or 1) // self.pool_size)
+        sess_options.inter_op_num_threads = profile["inter_op_num_threads"]
+        sess_options.execution_mode = getattr(ort.ExecutionMode, EXECUTION_MODES[profile["execution_mode"]])
+        sess_options.enable_cpu_mem_arena = profile["enable_cpu_mem_arena"]
+        sess_options.enable_mem_pattern = profile["enable_mem_pattern"]
+        return sess_options
+
+    def _mmap_weights(self, onnx_path: str) -> bool:
+        """Pesos externos (<modelo>.data) são mapeados em memória se o prepacking estiver desligado."""
+        return settings.NLU_MMAP_WEIGHTS and os.path.exists(f"{onnx_path}.data")
+
+    def _create_session(self, onnx_path: str) -> "ort.InferenceSession":
+        """
+        Cria a sessão com o perfil configurado em Settings.NLU_SESSION_PROFILE.
+        Se habilitado (Settings.NLU_SAVE_OPTIMIZED_MODEL), o grafo otimizado é salvo no runtime dir
+        e reaproveitado nos próximos startups (enquanto for mais novo que o model.onnx).
+        """
+        if self.session_profile not in SESSION_PROFILES:
+            raise ValueError(f"Perfil de sessão desconhecido: {self.session_profile}")
+
+        ort = import_ort()
+        profile = SESSION_PROFILES[self.session_profile]
+        sess_options = self._session_options(profile)
+
+        mmap_weights = self._mmap_weights(onnx_path)
+        if mmap_weights:
+            # NOTE: o prepacking copiaria os pesos para memória anônima, desfazendo o compartilhamento
+            sess_options.add_session_config_entry("session.disable_prepacking", "1")
+
+        if not self.save_optimized or profile["graph_optimization_level"] == "disable":
+            return ort.InferenceSession(onnx_path, sess_options)
+
+        # NOTE: o grafo otimizado pode conter otimizações específicas do hardware; só é reaproveitado na mesma máquina
+        optimized_name = os.path.basename(onnx_path).replace(".onnx", f".{self.session_profile}.optimized.onnx")
+        optimized_path = os.path.join(self.cache_dir, optimized_name)
+        if os.path.exists(optimized_path) and os.path.getmtime(optimized_path) >= os.path.getmtime(onnx_path):
+            logger.info(f"Usando grafo já otimizado em {optimized_path}")
+            sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            return ort.InferenceSession(optimized_path, sess_options)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        sess_options.optimized_model_filepath = optimized_path
+        if mmap_weights:
+            sess_options.add_session_config_entry(
+                "session.optimized_model_external_initializers_file_name", f"{optimized_name}.data"
+            )
+            sess_options.add_session_config_entry(
+                "session.optimized_model_external_initializers_min_size_in_bytes", "1024"
+            )
+        return ort.InferenceSession(onnx_path, sess_options)
+
+    def stats(self) -> dict:
+        """Métricas de fila/uso das sessões e de desperdício de padding."""
+        with self._stats_lock:
+            padding = dict(self.padding_stats)
+        return {
+            "pool": self.pool.stats() if self.pool else None,
+            "padding": padding,
+            "prediction_cache": self.prediction_cache.stats() if self.prediction_cache else None,
+        }
+
+    def count_tokens(self, texts: list[str]) -> list[int]:
+        """
+        Quantidade de tokens de cada texto com o tokenizer do modelo (sem tokens especiais,
+        padding ou truncation). Antes do load, usa uma estimativa de ~4 caracteres por token.
+        """
+        # NOTE: referências locais, o modelo pode ser descarregado (hot-swap) durante a chamada
+        tokenizer = self._counting_tokenizer
+        if tokenizer is None:
+            base = self.tokenizer
+            if base is None:
+                return estimate_tokens(texts)
+            tokenizer = Tokenizer.from_str(base.to_str())
+            tokenizer.no_padding()
+            tokenizer.no_truncation()
+            self._counting_tokenizer = tokenizer
+
+        encodings = tokenizer.encode_batch(texts, add_special_tokens=False)
+        return [len(e.ids) for e in encodings]
+
+    def _prediction_key(self, text: str, candidate_labels: list[str], *extra) -> str:
+        """Chave de memoização: texto normalizado + hash das labels + versão/variante do modelo."""
+        return PredictionCache.make_key(
+            type(self).__name__,
+            self.artifact_version,
+            self.model_variant,
+            PredictionCache.make_key(*candidate_labels),
+            normalize_text(text),
+            *extra
+        )
+
+    def _bucket_length(self, length: int):
+        """Menor bucket que comporta `length`. Sem buckets (ou acima do maior) retorna None."""
+        for bucket in self.length_buckets:
+            if length <= bucket:
+                return bucket
+        return None
+
+    def _pad_to(self, array: np.ndarray, length: int, value: int) -> np.ndarray:
+        missing = length - array.shape[1]
+        if missing <= 0:
+            return array
+        return np.pad(array, ((0, 0), (0, missing)), constant_values=value)
+
+    def _record_padding(self, attention_mask: np.ndarray) -> float:
+        """Contabiliza o desperdício de padding de um batch e devolve a fração de padding."""
+        total = attention_mask.size
+        padding = total - int(attention_mask.sum())
+        ratio = padding / total if total else 0.0
+
+        with self._stats_lock:
+            self.padding_stats["batches"] += 1
+            self.padding_stats["tokens"] += total
+            self.padding_stats["padding"] += padding
+            self.padding_stats["last_ratio"] = ratio
+
+        metrics.histogram("nlu.padding_ratio").observe(ratio)
+        logger.debug(f"Batch {attention_mask.shape}: {ratio:.1%} de padding")
+        return ratio
+
+    @instrument(name="model_embed")
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """
+        Embeddings normalizados (mean pooling da saída oculta do encoder).
+        Só funciona se o modelo exportar uma saída 3D (ex: last_hidden_state).
+        """
+        self._ensure_loaded()
+
+        output_names = [o.name for o in self.session.get_outputs()]
+        hidden_name = "last_hidden_state" if "last_hidden_state" in output_names else None
+        if hidden_name is None:
+            hidden_name = next((o.name for o in self.session.get_outputs() if len(o.shape) == 3), None)
+        if hidden_name is None:
+            raise ValueError(f"Modelo {self.artifact_name} não exporta estados ocultos para embeddings")
+
+        with timed("nlu.tokenize_ms"):
+            encodings = [self.tokenizer.encode(text) for text in texts]
+        length = max(len(e.ids) for e in encodings)
+        arrays = {
+            "input_ids": np.array([e.ids + [0] * (length - len(e.ids)) for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask + [0] * (length - len(e.ids)) for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids + [0] * (length - len(e.ids)) for e in encodings], dtype=np.int64),
+        }
+        model_input_names = [i.name for i in self.session.get_inputs()]
+        input_feed = {name: array for name, array in arrays.items() if name in model_input_names}
+
+        with self.pool.acquire() as session, timed("nlu.session_run_ms"):
+            hidden = session.run([hidden_name], input_feed)[0]
+
+        mask = arrays["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
 
     @instrument(name="model_generic_inference")
     def predict(self, text: str, labels: list = None):
@@ -67,8 +491,7 @@ class NLUEngine:
         Exemplo genérico de inferência.
         Dependendo do modelo (ZeroShot, NER), a lógica de pre/post processing muda.
         """
-        if not self.session:
-            self.load()
+        self._ensure_loaded()
 
         encoding = self.tokenizer.encode(text)
         
@@ -80,5 +503,6 @@ class NLUEngine:
         if len(self.session.get_inputs()) > 2:
             input_feed[self.session.get_inputs()[2].name] = np.array([encoding.type_ids], dtype=np.int64)
 
-        outputs = self.session.run(None, input_feed)
+        with self.pool.acquire() as session:
+            outputs = session.run(None, input_feed)
         return outputs
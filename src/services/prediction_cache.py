@@ -0,0 +1,151 @@
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+import redis
+import redis.asyncio
+
+from src.utils.config import settings
+from src.utils.metrics import metrics
+
+logger = logging.getLogger("prediction_cache")
+
+class PredictionCache:
+    """
+    Cache LRU em memória para predições determinísticas (texto, labels) -> (label, confiança),
+    com uma camada opcional compartilhada no Redis entre réplicas.
+
+    As chaves são montadas pelo chamador (NLUEngine._prediction_key) e já incluem a versão
+    do artefato, então um modelo novo invalida o cache sem precisar limpá-lo.
+    """
+    PREFIX = "intentcache"
+
+    def __init__(self, max_entries: int = 4096, ttl: int = 3600, use_redis: bool = False):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "redis_hits": 0, "misses": 0, "evictions": 0, "errors": 0}
+
+        self.client = None
+        self.async_client = None
+        if use_redis:
+            self.client = redis.Redis(
+                host=settings.REDIS_CACHE_HOST,
+                port=settings.REDIS_CACHE_PORT,
+                decode_responses=True
+            )
+            self.async_client = redis.asyncio.Redis(
+                host=settings.REDIS_CACHE_HOST,
+                port=settings.REDIS_CACHE_PORT,
+                decode_responses=True
+            )
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        raw = json.dumps(parts, ensure_ascii=False)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def _count(self, field: str, amount: int = 1):
+        with self._lock:
+            self._stats[field] += amount
+        metrics.counter(f"intent.cache.{field}").inc(amount)
+
+    def _get_local(self, key: str):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: tuple):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            self._count("evictions", evicted)
+
+    def _decode(self, raw: str) -> tuple:
+        label, score = json.loads(raw)
+        return label, score
+
+    def get(self, key: str):
+        """Retorna (label, confiança) ou None."""
+        value = self._get_local(key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        if self.client:
+            try:
+                raw = self.client.get(f"{self.PREFIX}:{key}")
+                if raw is not None:
+                    value = self._decode(raw)
+                    self._set_local(key, value)
+                    self._count("redis_hits")
+                    return value
+            except Exception as e:
+                self._count("errors")
+                logger.warning(f"Erro ao ler cache de predições no Redis: {e}")
+
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: tuple):
+        self._set_local(key, value)
+        if self.client:
+            try:
+                self.client.set(f"{self.PREFIX}:{key}", json.dumps(list(value)), ex=self.ttl)
+            except Exception as e:
+                self._count("errors")
+                logger.warning(f"Erro ao gravar cache de predições no Redis: {e}")
+
+    async def get_async(self, key: str):
+        """Versão assíncrona de get (só a camada Redis faz I/O)."""
+        value = self._get_local(key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        if self.async_client:
+            try:
+                raw = await self.async_client.get(f"{self.PREFIX}:{key}")
+                if raw is not None:
+                    value = self._decode(raw)
+                    self._set_local(key, value)
+                    self._count("redis_hits")
+                    return value
+            except Exception as e:
+                self._count("errors")
+                logger.warning(f"Erro ao ler cache de predições no Redis: {e}")
+
+        self._count("misses")
+        return None
+
+    async def set_async(self, key: str, value: tuple):
+        self._set_local(key, value)
+        if self.async_client:
+            try:
+                await self.async_client.set(f"{self.PREFIX}:{key}", json.dumps(list(value)), ex=self.ttl)
+            except Exception as e:
+                self._count("errors")
+                logger.warning(f"Erro ao gravar cache de predições no Redis: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["redis_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["redis_hits"]) / lookups if lookups else 0.0
+        stats["redis"] = self.client is not None
+        return stats
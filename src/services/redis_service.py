@@ -1,6 +1,8 @@
 import redis
+import redis.asyncio
 import json
 from src.utils.config import settings
+from src.utils.metrics import timed
 
 class RedisService:
     def __init__(self):
@@ -9,8 +11,20 @@ class RedisService:
             port=settings.REDIS_CACHE_PORT,
             decode_responses=True
         )
+        self.async_client = redis.asyncio.Redis(
+            host=settings.REDIS_CACHE_HOST,
+            port=settings.REDIS_CACHE_PORT,
+            decode_responses=True
+        )
         self.ttl = 3600 # 1 hour on session
         self.max_window = 10 # NOTE: context window size
+        self.max_messages = max(settings.SESSION_MAX_MESSAGES, self.max_window) # NOTE: tamanho máximo da lista no Redis
+
+    def _queue_append(self, pipe, key: str, messages: list[str]):
+        """RPUSH + LTRIM + EXPIRE enfileirados no mesmo pipeline (um único round-trip)."""
+        pipe.rpush(key, *messages)
+        pipe.ltrim(key, -self.max_messages, -1)
+        pipe.expire(key, self.ttl)
 
     def add_message(self, user_id: str, role: str, content: str):
         """
@@ -20,17 +34,85 @@ class RedisService:
         key = f"session:{user_id}"
         message = json.dumps({"role": role, "content": content})
         
-        self.client.rpush(key, message)
-        self.client.expire(key, self.ttl)
+        pipe = self.client.pipeline(transaction=True)
+        self._queue_append(pipe, key, [message])
+        with timed("redis.roundtrip_ms"):
+            pipe.execute()
+
+    async def add_message_async(self, user_id: str, role: str, content: str):
+        """Versão assíncrona de add_message."""
+        key = f"session:{user_id}"
+        message = json.dumps({"role": role, "content": content})
+
+        pipe = self.async_client.pipeline(transaction=True)
+        self._queue_append(pipe, key, [message])
+        with timed("redis.roundtrip_ms"):
+            await pipe.execute()
+
+    def append_turn(self, user_id: str, user_content: str, model_content: str):
+        """
+        Salva a mensagem do usuário e a resposta do modelo em uma única transação,
+        limitando a lista a `max_messages` e renovando o TTL.
+        """
+        key = f"session:{user_id}"
+        messages = [
+            json.dumps({"role": "user", "content": user_content}),
+            json.dumps({"role": "model", "content": model_content}),
+        ]
+
+        pipe = self.client.pipeline(transaction=True)
+        self._queue_append(pipe, key, messages)
+        with timed("redis.roundtrip_ms"):
+            pipe.execute()
+
+    async def append_turn_async(self, user_id: str, user_content: str, model_content: str):
+        """Versão assíncrona de append_turn."""
+        key = f"session:{user_id}"
+        messages = [
+            json.dumps({"role": "user", "content": user_content}),
+            json.dumps({"role": "model", "content": model_content}),
+        ]
+
+        pipe = self.async_client.pipeline(transaction=True)
+        self._queue_append(pipe, key, messages)
+        with timed("redis.roundtrip_ms"):
+            await pipe.execute()
 
     def get_context_window(self, user_id: str):
         """
         Recupera as últimas N mensagens para enviar ao LLM.
         """
         key = f"session:{user_id}"
-        messages_json = self.client.lrange(key, -self.max_window, -1)
+        with timed("redis.roundtrip_ms"):
+            messages_json = self.client.lrange(key, -self.max_window, -1)
         
         return [json.loads(m) for m in messages_json]
     
+    async def get_context_window_async(self, user_id: str):
+        """Versão assíncrona de get_context_window."""
+        key = f"session:{user_id}"
+        with timed("redis.roundtrip_ms"):
+            messages_json = await self.async_client.lrange(key, -self.max_window, -1)
+
+        return [json.loads(m) for m in messages_json]
+
+    async def get_history_async(self, user_id: str, limit: int = None):
+        """Histórico completo guardado da sessão (até `max_messages`), para montagem por orçamento de tokens."""
+        key = f"session:{user_id}"
+        with timed("redis.roundtrip_ms"):
+            messages_json = await self.async_client.lrange(key, -(limit or self.max_messages), -1)
+
+        return [json.loads(m) for m in messages_json]
+
+    async def get_summary_async(self, user_id: str):
+        """Resumo acumulado das mensagens antigas: {'text', 'last'} ou None."""
+        with timed("redis.roundtrip_ms"):
+            raw = await self.async_client.get(f"summary:{user_id}")
+        return json.loads(raw) if raw else None
+
+    async def set_summary_async(self, user_id: str, summary: dict):
+        with timed("redis.roundtrip_ms"):
+            await self.async_client.set(f"summary:{user_id}", json.dumps(summary), ex=self.ttl)
+
     def clear_history(self, user_id: str):
-        self.client.delete(f"session:{user_id}")
+        self.client.delete(f"session:{user_id}", f"summary:{user_id}")
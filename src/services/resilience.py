@@ -0,0 +1,217 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+
+from src.utils.metrics import metrics
+
+logger = logging.getLogger("resilience")
+
+class CircuitOpenError(RuntimeError):
+    """Circuito aberto: o upstream falhou demais e as chamadas estão sendo recusadas sem tentar."""
+
+
+class CircuitBreaker:
+    """
+    Fechado: chamadas passam. Depois de `failure_threshold` falhas seguidas, abre e recusa
+    tudo por `reset_timeout` segundos; então deixa uma chamada de teste passar (meio-aberto),
+    que fecha o circuito se der certo ou o reabre se falhar.
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_id = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        None: chamada recusada. 0: chamada normal (circuito fechado). >0: id da chamada de teste
+        do meio-aberto, que precisa ser devolvido em release() quando a chamada terminar.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return 0
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                self._probe_id += 1
+                return self._probe_id
+        metrics.counter(f"{self.name}.circuit_rejected").inc()
+        return None
+
+    def allow(self) -> bool:
+        return self.acquire() is not None
+
+    def release(self, probe):
+        """
+        Fim de uma chamada (sempre, em um finally). Se a chamada de teste terminou sem resultado
+        (cancelada), libera outra sonda; sem isso o circuito ficaria meio-aberto recusando tudo.
+        """
+        if not probe:
+            return
+        with self._lock:
+            if self._probing and probe == self._probe_id:
+                self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != "closed":
+                logger.info(f"Circuito {self.name} fechado.")
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"Circuito {self.name} aberto após {self._failures} falhas.")
+                    metrics.counter(f"{self.name}.circuit_opened").inc()
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self._failures}
+
+
+def backoff_delay(attempt: int, base: float, cap: float = 5.0) -> float:
+    """Backoff exponencial com full jitter."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class ResilientCaller:
+    """
+    Política de chamada a um upstream: timeout por tentativa, prazo total, retries com
+    jitter, requisição hedge opcional e circuit breaker. Registra latência, retries,
+    hedges e timeouts nas métricas com o prefixo `name`.
+    """
+    def __init__(
+        self,
+        name: str,
+        timeout: float,
+        deadline: float,
+        max_retries: int,
+        backoff: float,
+        breaker: CircuitBreaker,
+        is_retryable=None,
+        is_response=None,
+        hedge: bool = False,
+        hedge_delay: float = None
+    ):
+        """
+        is_retryable: função Exception -> bool (padrão: tudo é retentável)
+        is_response: função Exception -> bool; erros em que o upstream respondeu (ex: 4xx) contam como
+            sucesso para o circuit breaker (padrão: nenhum)
+        hedge_delay: segundos até disparar a segunda requisição; None usa o p95 observado
+        """
+        self.name = name
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker
+        self.is_retryable = is_retryable or (lambda e: True)
+        self.is_response = is_response or (lambda e: False)
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.latency = metrics.histogram(f"{name}.latency_ms")
+
+    def _hedge_after(self) -> float:
+        if self.hedge_delay:
+            return self.hedge_delay
+        snapshot = self.latency.snapshot()
+        if snapshot["count"] < 20 or "p95" not in snapshot:
+            return self.timeout / 2
+        return snapshot["p95"] / 1000
+
+    async def _attempt(self, call, timeout: float):
+        start = time.perf_counter()
+        result = await asyncio.wait_for(call(), timeout=timeout)
+        self.latency.observe((time.perf_counter() - start) * 1000)
+        return result
+
+    async def _hedged(self, call, timeout: float):
+        """Dispara a chamada e, se ela passar do atraso de hedge, uma segunda; vale a primeira que responder."""
+        primary = asyncio.create_task(self._attempt(call, timeout))
+        done, _ = await asyncio.wait({primary}, timeout=min(self._hedge_after(), timeout))
+        if done:
+            return primary.result()
+
+        metrics.counter(f"{self.name}.hedges").inc()
+        secondary = asyncio.create_task(self._attempt(call, timeout))
+        pending = {primary, secondary}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is secondary:
+                            metrics.counter(f"{self.name}.hedge_wins").inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, call):
+        """
+        call: função sem argumentos que devolve um awaitable novo a cada tentativa.
+        Levanta CircuitOpenError, asyncio.TimeoutError ou o último erro do upstream.
+        """
+        probe = self.breaker.acquire()
+        if probe is None:
+            raise CircuitOpenError(f"Circuito {self.name} aberto")
+        try:
+            return await self._call(call)
+        finally:
+            self.breaker.release(probe)
+
+    async def _call(self, call):
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            remaining = self.deadline - (time.monotonic() - started)
+            timeout = min(self.timeout, remaining)
+            try:
+                if timeout <= 0:
+                    raise asyncio.TimeoutError()
+                if self.hedge:
+                    result = await self._hedged(call, timeout)
+                else:
+                    result = await self._attempt(call, timeout)
+                self.breaker.record_success()
+                return result
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    metrics.counter(f"{self.name}.timeouts").inc()
+                retryable = isinstance(e, asyncio.TimeoutError) or self.is_retryable(e)
+                if retryable:
+                    self.breaker.record_failure()
+                elif self.is_response(e):
+                    self.breaker.record_success() # NOTE: o upstream respondeu (ex: 4xx); a sonda do meio-aberto terminou
+
+                delay = backoff_delay(attempt, self.backoff)
+                out_of_time = time.monotonic() - started + delay >= self.deadline
+                if not retryable or attempt >= self.max_retries or out_of_time or self.breaker.state != "closed":
+                    metrics.counter(f"{self.name}.errors").inc()
+                    raise
+
+                attempt += 1
+                metrics.counter(f"{self.name}.retries").inc()
+                logger.warning(f"{self.name}: tentativa {attempt} falhou ({type(e).__name__}: {e}). Repetindo em {delay:.2f}s")
+                await asyncio.sleep(delay)
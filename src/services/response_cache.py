@@ -0,0 +1,209 @@
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+import numpy as np
+from collections import Counter
+
+from src.utils.config import settings
+from src.utils.text import normalize_text
+
+logger = logging.getLogger("response_cache")
+
+class ResponseCache:
+    """
+    Cache de respostas do LLM no Redis.
+
+    A chave combina a intenção detectada, o hash da mensagem normalizada e uma impressão
+    digital das últimas mensagens do histórico. Só é compartilhada entre usuários quando o
+    histórico inteiro cabe na impressão digital (ex: início de conversa); com histórico mais
+    longo, a chave inclui o usuário, já que a resposta pode depender de turnos que a chave não vê.
+    As entradas expiram por TTL e, acima de `max_entries`, as menos usadas recentemente são
+    removidas (índice LRU em um ZSET).
+
+    Com `embed` (texto -> vetor normalizado, ex: o intent_embedder; o modelo NLI não gera
+    embeddings), mensagens parecidas também acertam o cache quando a similaridade de
+    cosseno passa de `similarity`.
+    """
+    PREFIX = "respcache"
+
+    def __init__(self, client, embed=None):
+        """
+        client: cliente redis.asyncio (decode_responses=True)
+        embed: função síncrona list[str] -> np.ndarray de embeddings normalizados
+        """
+        self.client = client
+        self.embed = embed if settings.RESPONSE_CACHE_SEMANTIC else None
+        self.ttl = settings.RESPONSE_CACHE_TTL
+        self.max_entries = settings.RESPONSE_CACHE_MAX_ENTRIES
+        self.history_turns = settings.RESPONSE_CACHE_HISTORY_TURNS
+        self.similarity = settings.RESPONSE_CACHE_SIMILARITY
+        self.stats_local = {"hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "errors": 0}
+        self._stats_pending = Counter() # NOTE: enviado ao Redis junto do próximo pipeline, não um comando por lookup
+
+    @staticmethod
+    def normalize(message: str) -> str:
+        return normalize_text(message)
+
+    def _history_fingerprint(self, history: list) -> str:
+        if not self.history_turns or not history:
+            return "-"
+        recent = history[-self.history_turns:]
+        raw = json.dumps([[m["role"], self.normalize(m["content"])] for m in recent], ensure_ascii=False)
+        return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+    def _scope(self, intent: str, history: list, user_id: str):
+        """Escopo da chave; None quando a entrada não pode ser compartilhada nem atribuída a um usuário."""
+        fingerprint = self._history_fingerprint(history)
+        if not history or len(history) <= self.history_turns:
+            return f"{intent}:{fingerprint}"
+        if not user_id:
+            return None
+        user_hash = hashlib.sha1(user_id.encode()).hexdigest()[:16]
+        return f"{intent}:u{user_hash}:{fingerprint}"
+
+    def _keys(self, intent: str, message: str, history: list, user_id: str = None):
+        scope = self._scope(intent, history, user_id)
+        if scope is None:
+            return None
+        message_hash = hashlib.sha1(self.normalize(message).encode()).hexdigest()
+        return (
+            f"{self.PREFIX}:entry:{scope}:{message_hash}",
+            f"{self.PREFIX}:vec:{scope}",
+            message_hash,
+        )
+
+    def _count(self, field: str, amount: int = 1):
+        self.stats_local[field] += amount
+        self._stats_pending[field] += amount
+
+    def _flush_stats(self, pipe):
+        for field, amount in self._stats_pending.items():
+            pipe.hincrby(f"{self.PREFIX}:stats", field, amount)
+        self._stats_pending.clear()
+
+    async def _embed(self, message: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        try:
+            vectors = await loop.run_in_executor(None, self.embed, [self.normalize(message)])
+            return vectors[0].astype(np.float32)
+        except ValueError as e:
+            # NOTE: o modelo não gera embeddings (ex: NLI que só exporta logits); não adianta tentar de novo
+            logger.warning(f"Modelo sem embeddings, desativando a busca semântica do cache de respostas: {e}")
+            self.embed = None
+            return None
+        except Exception as e:
+            logger.warning(f"Embeddings indisponíveis, pulando a busca semântica: {e}")
+            return None
+
+    async def _semantic_lookup(self, vec_key: str, message: str):
+        vector = await self._embed(message)
+        if vector is None:
+            return None
+
+        stored = await self.client.hgetall(vec_key)
+        if not stored:
+            return None
+
+        hashes = list(stored.keys())
+        matrix = np.stack([np.frombuffer(base64.b64decode(stored[h]), dtype=np.float32) for h in hashes])
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+
+        entry_key = vec_key.replace(":vec:", ":entry:") + f":{hashes[best]}"
+        cached = await self.client.get(entry_key)
+        if cached is None:
+            await self.client.hdel(vec_key, hashes[best])
+            return None
+        return entry_key, cached
+
+    async def get(self, intent: str, message: str, history: list = None, user_id: str = None):
+        """Retorna (resposta, tipo de acerto) ou (None, "miss")."""
+        keys = self._keys(intent, message, history, user_id)
+        if keys is None:
+            self._count("misses")
+            return None, "miss"
+        entry_key, vec_key, _ = keys
+        try:
+            cached = await self.client.get(entry_key)
+            kind = "hit"
+
+            if cached is None and self.embed:
+                found = await self._semantic_lookup(vec_key, message)
+                if found:
+                    entry_key, cached = found
+                    kind = "semantic_hit"
+
+            if cached is None:
+                self._count("misses")
+                return None, "miss"
+
+            self._count("hits" if kind == "hit" else "semantic_hits")
+            pipe = self.client.pipeline(transaction=False)
+            pipe.zadd(f"{self.PREFIX}:lru", {entry_key: time.time()})
+            self._flush_stats(pipe)
+            await pipe.execute()
+            return json.loads(cached)["response"], kind
+        except Exception as e:
+            self.stats_local["errors"] += 1
+            logger.error(f"Erro ao ler cache de respostas: {e}")
+            return None, "miss"
+
+    async def set(self, intent: str, message: str, history: list, response: str, user_id: str = None):
+        keys = self._keys(intent, message, history, user_id)
+        if keys is None:
+            return
+        entry_key, vec_key, message_hash = keys
+        try:
+            vector = await self._embed(message) if self.embed else None
+
+            pipe = self.client.pipeline(transaction=False)
+            pipe.set(entry_key, json.dumps({"message": message, "response": response}), ex=self.ttl)
+            pipe.zadd(f"{self.PREFIX}:lru", {entry_key: time.time()})
+            if vector is not None:
+                pipe.hset(vec_key, message_hash, base64.b64encode(vector.tobytes()).decode())
+                pipe.expire(vec_key, self.ttl)
+            self._flush_stats(pipe)
+            # NOTE: o TTL conta da gravação e o score é o último uso, então score < agora - TTL já expirou
+            pipe.zremrangebyscore(f"{self.PREFIX}:lru", "-inf", time.time() - self.ttl)
+            pipe.zcard(f"{self.PREFIX}:lru")
+            size = (await pipe.execute())[-1]
+
+            if size > self.max_entries:
+                await self._evict(size - self.max_entries)
+        except Exception as e:
+            self.stats_local["errors"] += 1
+            logger.error(f"Erro ao gravar cache de respostas: {e}")
+
+    async def _evict(self, count: int):
+        evicted = await self.client.zpopmin(f"{self.PREFIX}:lru", count)
+        if not evicted:
+            return
+
+        pipe = self.client.pipeline(transaction=False)
+        for entry_key, _ in evicted:
+            pipe.delete(entry_key)
+            scope, message_hash = entry_key.rsplit(":", 1)
+            pipe.hdel(scope.replace(":entry:", ":vec:"), message_hash)
+        self._count("evictions", len(evicted))
+        self._flush_stats(pipe)
+        await pipe.execute()
+
+    async def stats(self) -> dict:
+        """`shared` soma todos os workers; cada um envia seus contadores junto das próprias escritas."""
+        pipe = self.client.pipeline(transaction=False)
+        self._flush_stats(pipe)
+        pipe.zremrangebyscore(f"{self.PREFIX}:lru", "-inf", time.time() - self.ttl)
+        pipe.hgetall(f"{self.PREFIX}:stats")
+        pipe.zcard(f"{self.PREFIX}:lru")
+        *_, shared, entries = await pipe.execute()
+        return {
+            "local": dict(self.stats_local),
+            "shared": {k: int(v) for k, v in shared.items()},
+            "entries": entries,
+            "semantic": self.embed is not None,
+        }
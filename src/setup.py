@@ -4,24 +4,25 @@ import os
 
 sys.path.append(os.getcwd())
 
-from src.services.model_builder import ModelBuilder
+from src.services.model_builder import ModelBuilder, load_build_manifest
 from src.utils.config import settings
+from src.utils.storage import LocalStorage, ArtifactStore
 
 logger = logging.getLogger("Entrypoint")
 logging.basicConfig(level=logging.INFO)
 
-MODEL_ID = "Xenova/nli-deberta-v3-xsmall"
-ARTIFACT_NAME = "intent_classifier.zip"
-
-def main():
-    artifact_path = os.path.join(settings.ARTIFACTS_PATH, ARTIFACT_NAME)
-    if os.path.exists(artifact_path):
-        logger.info(f"Modelo já existe em {artifact_path}. Pulando build.")
+def build(store: ArtifactStore, entry: dict):
+    """entry: {"model", "name", "quantize"?, "eval_set"?} do manifest de build."""
+    artifact = entry["name"].replace(".zip", "")
+    if store.is_complete(artifact):
+        logger.info(f"Modelo {artifact}@{store.current_version(artifact)} já publicado e íntegro. Pulando build.")
         return
 
     builder = ModelBuilder(
-        model_id=MODEL_ID,
-        artifact_name=ARTIFACT_NAME
+        model_id=entry["model"],
+        artifact_name=entry["name"],
+        quantize=entry.get("quantize", False),
+        eval_set=entry.get("eval_set")
     )
     logger.info("Rodando builder...")
     if builder.run():
@@ -29,6 +30,25 @@ def main():
     else:
         logger.error("Builder falhou.")
 
+def needed(entry: dict) -> bool:
+    """Só builda os modelos de intenção que o modo configurado usa (INTENT_MODE, EMBEDDER_ENABLED)."""
+    embedding = settings.INTENT_MODE == "embedding"
+    if entry["name"] == settings.INTENT_EMBEDDING_ARTIFACT:
+        return embedding or settings.EMBEDDER_ENABLED
+    if entry["name"] == "intent_classifier.zip":
+        return not embedding
+    return True
+
+def main():
+    # NOTE: os modelos vêm do manifest de build (Settings.BUILD_MANIFEST), o mesmo do scripts/build_models.py
+    store = ArtifactStore(LocalStorage(base_path=settings.ARTIFACTS_PATH), cache_dir="/tmp/artifact_cache")
+    for entry in load_build_manifest(settings.BUILD_MANIFEST):
+        if not needed(entry):
+            logger.info(f"{entry['name']} não é usado com INTENT_MODE={settings.INTENT_MODE}. Pulando build.")
+            continue
+        build(store, entry)
+    store.prune_cache()
+
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,25 @@
+import os
+import json
 import streamlit as st
 import requests
 
 st.set_page_config(page_title="Compound AI PoC", page_icon="🤖")
 st.title("🤖 Compound AI - Debug Console")
-API_URL = "http://app:8002/chat" 
+API_URL = os.getenv("API_URL", "http://app:8002")
+
+def stream_chat(payload: dict):
+    """Consome o SSE do /chat/stream, devolvendo (evento, dados) conforme chegam."""
+    with requests.post(f"{API_URL}/chat/stream", json=payload, stream=True, timeout=120) as response:
+        if response.status_code != 200:
+            yield "error", {"detail": response.text}
+            return
+
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                yield event, json.loads(line[len("data: "):])
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -20,17 +36,23 @@ if prompt := st.chat_input("Diga algo para o Gemini 2.0..."):
     with st.chat_message("assistant"):
         message_placeholder = st.empty()
         message_placeholder.markdown("Pensando...")
-        
+
         try:
             payload = {"message": prompt, "user_id": "demo_user"}
-            response = requests.post("http://app:8002/chat", json=payload)
-            
-            if response.status_code == 200:
-                data = response.json()
-                ai_response = data["response"]
+            ai_response = ""
+
+            for event, data in stream_chat(payload):
+                if event == "token":
+                    ai_response += data["text"]
+                    message_placeholder.markdown(ai_response + "▌")
+                elif event == "done":
+                    ai_response = data["response"]
+                elif event == "error":
+                    message_placeholder.error(f"Erro na API: {data['detail']}")
+                    break
+
+            if ai_response:
                 message_placeholder.markdown(ai_response)
                 st.session_state.messages.append({"role": "assistant", "content": ai_response})
-            else:
-                message_placeholder.error(f"Erro na API: {response.text}")
         except Exception as e:
-             message_placeholder.error(f"Erro de conexão: {e}")
\ No newline at end of file
+             message_placeholder.error(f"Erro de conexão: {e}")
@@ -11,14 +11,121 @@ class Settings:
     # Service - LLM
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     GEMINI_MODEL = "gemini-2.0-flash"
+    GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") # NOTE: vazio usa a API do Google; em testes aponta para o scripts/mock_gemini.py (src/services/mock_gemini.py)
+    LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini") # NOTE: "fake" usa o FakeLLMService local (testes/benchmarks)
+    FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", 300))
+    FAKE_LLM_TOKEN_DELAY_MS = float(os.getenv("FAKE_LLM_TOKEN_DELAY_MS", 20))
+
+    # Service - LLM (política de chamada: timeouts, retries, hedge e circuit breaker)
+    LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", 20)) # NOTE: por tentativa
+    LLM_DEADLINE_S = float(os.getenv("LLM_DEADLINE_S", 30)) # NOTE: total, somando retries
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+    LLM_RETRY_BACKOFF_MS = float(os.getenv("LLM_RETRY_BACKOFF_MS", 200))
+    LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+    LLM_HEDGE_DELAY_MS = float(os.getenv("LLM_HEDGE_DELAY_MS", 0)) # NOTE: 0 = p95 observado
+    LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+    LLM_BREAKER_RESET_S = float(os.getenv("LLM_BREAKER_RESET_S", 30))
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 2 * (os.cpu_count() or 1) + 4)) # NOTE: pool HTTP por worker
     
     # Service - NLP Models
-    ARTIFACTS_PATH = str(ARTIFACTS_DIR)
+    ARTIFACTS_PATH = os.getenv("ARTIFACTS_PATH", str(ARTIFACTS_DIR)) # NOTE: testes apontam para um diretório temporário
+    NLU_MODEL_VARIANT = os.getenv("NLU_MODEL_VARIANT", "fp32") # NOTE: fp32 ou int8 (quando o artefato tiver)
+    INTENT_EVAL_SET = os.getenv("INTENT_EVAL_SET", str(BASE_DIR / "data" / "eval" / "intent_eval.jsonl"))
+
+    # Service - Model Builder (cache do HuggingFace compartilhado entre builds paralelos)
+    HF_CACHE_DIR = os.getenv("HF_CACHE_DIR", "/tmp/hf_cache")
+    BUILD_STAGING_ROOT = os.getenv("BUILD_STAGING_ROOT", "/tmp/staging")
+    BUILD_MANIFEST = os.getenv("BUILD_MANIFEST", str(BASE_DIR / "data" / "models.json"))
+
+    # Service - NLP Models (perfil da sessão ONNX: latency, throughput ou low_memory)
+    NLU_SESSION_PROFILE = os.getenv("NLU_SESSION_PROFILE", "latency")
+    NLU_SAVE_OPTIMIZED_MODEL = os.getenv("NLU_SAVE_OPTIMIZED_MODEL", "true").lower() == "true"
+
+    # Service - NLP Models (pesos em <modelo>.data mapeados em memória e compartilhados entre workers)
+    NLU_EXTERNAL_WEIGHTS = os.getenv("NLU_EXTERNAL_WEIGHTS", "true").lower() == "true"
+    NLU_MMAP_WEIGHTS = os.getenv("NLU_MMAP_WEIGHTS", "true").lower() == "true"
+
+    # Service - NLP Models (pool de sessões e backpressure)
+    NLU_SESSION_POOL_SIZE = int(os.getenv("NLU_SESSION_POOL_SIZE", 1))
+    NLU_POOL_MAX_WAITING = int(os.getenv("NLU_POOL_MAX_WAITING", 64))
+    NLU_POOL_ACQUIRE_TIMEOUT = float(os.getenv("NLU_POOL_ACQUIRE_TIMEOUT", 5))
+    NLU_EXECUTOR_WORKERS = int(os.getenv("NLU_EXECUTOR_WORKERS", 4))
+
+    # Service - NLP Models (micro-batching entre requisições)
+    NLU_BATCHING_ENABLED = os.getenv("NLU_BATCHING_ENABLED", "true").lower() == "true"
+    NLU_BATCH_MAX_SIZE = int(os.getenv("NLU_BATCH_MAX_SIZE", 16))
+    NLU_BATCH_MAX_WAIT_MS = float(os.getenv("NLU_BATCH_MAX_WAIT_MS", 5))
+
+    # Service - NLP Models (buckets de comprimento; vazio = padding até o maior do batch)
+    NLU_LENGTH_BUCKETS = [
+        int(b) for b in os.getenv("NLU_LENGTH_BUCKETS", "16,32,64,128,256,512").split(",") if b.strip()
+    ]
+
+    # Service - NLP Models (warm-up no startup; /health/ready só responde 200 depois dele)
+    NLU_WARMUP_ON_STARTUP = os.getenv("NLU_WARMUP_ON_STARTUP", "true").lower() == "true"
+    NLU_WARMUP_MAX_LENGTH = int(os.getenv("NLU_WARMUP_MAX_LENGTH", 128))
+    NLU_MODEL_MEMORY_BUDGET_MB = float(os.getenv("NLU_MODEL_MEMORY_BUDGET_MB", 0)) # NOTE: ModelRegistry; 0 = sem limite
+    NLU_MODEL_DRAIN_TIMEOUT_S = float(os.getenv("NLU_MODEL_DRAIN_TIMEOUT_S", 30)) # NOTE: espera das requisições na versão antiga no hot-swap
+    NLU_MODEL_WATCH_INTERVAL = float(os.getenv("NLU_MODEL_WATCH_INTERVAL", 0)) # NOTE: segundos entre checagens de versão nova publicada; 0 = desligado
+    CLASSIFY_BATCH_MAX_ITEMS = int(os.getenv("CLASSIFY_BATCH_MAX_ITEMS", 512)) # NOTE: /classify/batch; volumes maiores vão pelo scripts/classify_jsonl.py
+    CLASSIFY_MAX_LABELS = int(os.getenv("CLASSIFY_MAX_LABELS", 32)) # NOTE: labels por requisição do /classify/batch
+    CLASSIFY_MAX_LABEL_CHARS = int(os.getenv("CLASSIFY_MAX_LABEL_CHARS", 100))
+    CLASSIFY_MAX_MESSAGE_CHARS = int(os.getenv("CLASSIFY_MAX_MESSAGE_CHARS", 2000))
+    NLU_LABEL_SETS_MAX = int(os.getenv("NLU_LABEL_SETS_MAX", 16)) # NOTE: conjuntos de labels preparados (hipóteses/índices) em memória por modelo, LRU
+
+    # Service - NLP Models (intenções candidatas do /chat e do /classify/batch; os scripts usam as mesmas)
+    POSSIBLE_INTENTS = ["saudação", "falar sobre música", "dúvida técnica", "reflexão", "outros"]
+
+    # Service - NLP Models (cascata: regras e centróides respondem antes do modelo NLI)
+    INTENT_CASCADE_ENABLED = os.getenv("INTENT_CASCADE_ENABLED", "true").lower() == "true"
+    INTENT_RULES_PATH = os.getenv("INTENT_RULES_PATH", str(BASE_DIR / "data" / "intent_rules.json"))
+    INTENT_KEYWORD_CONFIDENCE = float(os.getenv("INTENT_KEYWORD_CONFIDENCE", 0.99))
+    INTENT_CENTROID_EXAMPLES = os.getenv("INTENT_CENTROID_EXAMPLES", "") # NOTE: JSONL {"text", "intent"}; vazio ou sem embedder desativa o estágio
+    INTENT_CENTROID_THRESHOLD = float(os.getenv("INTENT_CENTROID_THRESHOLD", 0.85))
+    INTENT_CENTROID_MARGIN = float(os.getenv("INTENT_CENTROID_MARGIN", 0.05))
+
+    # Service - NLP Models (modo de classificação: "nli" zero-shot ou "embedding" com índice de labels)
+    INTENT_MODE = os.getenv("INTENT_MODE", "nli")
+    INTENT_EMBEDDING_ARTIFACT = os.getenv("INTENT_EMBEDDING_ARTIFACT", "intent_embedder.zip")
+    INTENT_EMBEDDING_EXAMPLES = os.getenv("INTENT_EMBEDDING_EXAMPLES", "") # NOTE: JSONL {"text", "intent"} opcional
+    INTENT_EMBEDDING_TEMPERATURE = float(os.getenv("INTENT_EMBEDDING_TEMPERATURE", 0.05))
+    INTENT_INDEX_RELOAD_INTERVAL = float(os.getenv("INTENT_INDEX_RELOAD_INTERVAL", 30))
+    EMBEDDER_ENABLED = os.getenv("EMBEDDER_ENABLED", "false").lower() == "true" # NOTE: carrega o INTENT_EMBEDDING_ARTIFACT no modo nli (o modelo NLI não gera embeddings)
+
+    # Service - NLP Models (memoização das predições; a chave inclui a versão do artefato)
+    INTENT_CACHE_ENABLED = os.getenv("INTENT_CACHE_ENABLED", "true").lower() == "true"
+    INTENT_CACHE_MAX_ENTRIES = int(os.getenv("INTENT_CACHE_MAX_ENTRIES", 4096))
+    INTENT_CACHE_TTL = int(os.getenv("INTENT_CACHE_TTL", 3600))
+    INTENT_CACHE_REDIS = os.getenv("INTENT_CACHE_REDIS", "false").lower() == "true" # NOTE: camada compartilhada entre réplicas
 
     # Infra - Cache (Redis)
     REDIS_CACHE_HOST = os.getenv("REDIS_CACHE_HOST", "redis_cache")
     REDIS_CACHE_PORT = int(os.getenv("REDIS_CACHE_PORT", 6379))
+    SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", 50)) # NOTE: limite da lista de histórico por sessão
+
+    # Service - LLM (histórico enviado ao LLM limitado por tokens, contados com o tokenizer local)
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1024))
+    CONTEXT_SUMMARY_ENABLED = os.getenv("CONTEXT_SUMMARY_ENABLED", "false").lower() == "true" # NOTE: resumo acumulado das mensagens antigas (custa uma chamada ao LLM)
+
+    # Infra - Cache de respostas do LLM
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 3600))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 10000))
+    RESPONSE_CACHE_HISTORY_TURNS = int(os.getenv("RESPONSE_CACHE_HISTORY_TURNS", 2)) # NOTE: 0 = ignora o histórico na chave
+    RESPONSE_CACHE_SEMANTIC = os.getenv("RESPONSE_CACHE_SEMANTIC", "false").lower() == "true" # NOTE: desligado por padrão; exige EMBEDDER_ENABLED (ou INTENT_MODE=embedding), o modelo NLI não gera embeddings
+    RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", 0.92))
     
+    # Infra - Serving (scripts/serve.py: supervisor que pré-carrega o modelo e faz fork dos workers)
+    SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", 0)) # NOTE: 0 = um worker por núcleo disponível (cgroup/afinidade)
+
+    # Infra - Observabilidade (traces, métricas e profiler)
+    OTEL_SAMPLE_RATIO = float(os.getenv("OTEL_SAMPLE_RATIO", 0.1)) # NOTE: fração dos traces gravados; as métricas medem todas as chamadas
+    OTEL_TRACES_EXPORTER = os.getenv("OTEL_TRACES_EXPORTER", "none") # NOTE: otlp | file | console | none (sem tracing)
+    OTEL_EXPORTER_ENDPOINT = os.getenv("OTEL_EXPORTER_ENDPOINT", "http://jaeger:4317")
+    OTEL_TRACES_FILE = os.getenv("OTEL_TRACES_FILE", "traces.jsonl")
+    PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true" # NOTE: libera o /debug/profile
+    PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", 30))
+
     # Infra - Knowledge Graph (FalkorDB on Redis)
     FALKORDB_HOST = os.getenv("FALKORDB_HOST", "falkordb")
     FALKORDB_PORT = int(os.getenv("FALKORDB_PORT", 6379))
@@ -0,0 +1,22 @@
+import json
+
+TEXT_FIELDS = ("message", "text", "body", "title")
+
+def record_text(record: dict, field: str = None):
+    """Texto da linha: campo `field` ou o primeiro campo de texto conhecido (None se não houver)."""
+    text = record.get(field) if field else None
+    if not isinstance(text, str):
+        text = next((record[k] for k in TEXT_FIELDS if isinstance(record.get(k), str)), None)
+    return text
+
+def load_messages(path: str, field: str = None) -> list[str]:
+    """Lê o JSONL e extrai o texto de cada linha (linhas vazias ou sem texto são puladas)."""
+    messages = []
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            text = record_text(json.loads(line), field)
+            if text:
+                messages.append(text)
+    return messages
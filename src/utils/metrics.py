@@ -0,0 +1,138 @@
+import re
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+class Histogram:
+    """
+    Histograma em memória: contagem e soma totais, percentis sobre uma janela
+    das últimas `window` observações.
+    """
+    def __init__(self, name: str, description: str = "", window: int = 4096):
+        self.name = name
+        self.description = description
+        self._samples = deque(maxlen=window)
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._samples.append(value)
+            self._count += 1
+            self._sum += value
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._count = 0
+            self._sum = 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = np.array(self._samples, dtype=np.float64)
+            count, total = self._count, self._sum
+
+        if not len(samples):
+            return {"count": count, "sum": total}
+
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        return {
+            "count": count,
+            "sum": total,
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+            "max": float(samples.max()),
+        }
+
+
+class Counter:
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def reset(self):
+        with self._lock:
+            self._value = 0
+
+    def snapshot(self) -> dict:
+        return {"value": self._value}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, description: str):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(name, cls(name, description))
+        return metric
+
+    def histogram(self, name: str, description: str = "") -> Histogram:
+        return self._get_or_create(Histogram, name, description)
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        return self._get_or_create(Counter, name, description)
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in sorted(self._metrics.items())}
+
+    def reset(self):
+        """Zera as métricas no lugar: quem guardou a referência (ex: um histograma de módulo) continua registrado."""
+        with self._lock:
+            registered = list(self._metrics.values())
+        for metric in registered:
+            metric.reset()
+
+    def render_prometheus(self, prefix: str = "compound_ai") -> str:
+        """
+        Formato texto do Prometheus. Histogramas saem como summary (quantis da janela + _sum/_count),
+        contadores como counter (_total). Pontos no nome viram '_'.
+        """
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            metric_name = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', name)}"
+            data = metric.snapshot()
+            if metric.description:
+                lines.append(f"# HELP {metric_name} {metric.description}")
+
+            if isinstance(metric, Histogram):
+                lines.append(f"# TYPE {metric_name} summary")
+                for key, quantile in (("p50", "0.5"), ("p95", "0.95"), ("p99", "0.99")):
+                    if key in data:
+                        lines.append(f'{metric_name}{{quantile="{quantile}"}} {data[key]}')
+                lines.append(f"{metric_name}_sum {data['sum']}")
+                lines.append(f"{metric_name}_count {data['count']}")
+            else:
+                lines.append(f"# TYPE {metric_name} counter")
+                lines.append(f"{metric_name}_total {data['value']}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+@contextmanager
+def timed(name: str):
+    """Mede o bloco em milissegundos no histograma `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.histogram(name).observe((time.perf_counter() - start) * 1000)
+
+async def timed_async(name: str, awaitable):
+    """Mede um awaitable (ex: um dos braços de um asyncio.gather)."""
+    with timed(name):
+        return await awaitable
@@ -0,0 +1,33 @@
+import sys
+import time
+import threading
+from collections import Counter
+
+def _stack(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> dict:
+    """
+    Profiler por amostragem: lê as pilhas de todas as threads a cada `interval` segundos
+    durante `seconds` e devolve {pilha colapsada: amostras}, no formato do flamegraph.pl/speedscope.
+    Não instrumenta nada, então o custo fora da janela de coleta é zero.
+    """
+    own = threading.get_ident()
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    samples = 0
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id != own:
+                counts[_stack(frame)] += 1
+        samples += 1
+        time.sleep(interval)
+    return {"samples": samples, "stacks": counts}
+
+def render_collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
@@ -1,9 +1,24 @@
 import shutil
 import os
+import json
+import time
+import hashlib
 import logging
 
 logger = logging.getLogger("storage")
 
+def atomic_copy(src: str, dest: str):
+    tmp_path = f"{dest}.tmp-{os.getpid()}"
+    shutil.copy2(src, tmp_path)
+    os.replace(tmp_path, dest)
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
 class LocalStorage:
     """
     Simula um Bucket de Cloud Service, mas operando no sistema de arquivos local.
@@ -14,10 +29,10 @@ class LocalStorage:
         os.makedirs(self.base_path, exist_ok=True)
 
     def upload(self, local_file: str, remote_path: str):
-        """Copia arquivo local para o 'bucket' local."""
+        """Copia arquivo local para o 'bucket' local (via temporário + rename, nunca pela metade)."""
         dest_path = os.path.join(self.base_path, remote_path)
         os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-        shutil.copy2(local_file, dest_path)
+        atomic_copy(local_file, dest_path)
         logger.info(f"Upload (Copy): {local_file} -> {dest_path}")
 
     def download(self, remote_path: str, local_dest: str):
@@ -27,9 +42,16 @@ class LocalStorage:
             raise FileNotFoundError(f"Objeto não encontrado no storage: {src_path}")
         
         os.makedirs(os.path.dirname(local_dest), exist_ok=True)
-        shutil.copy2(src_path, local_dest)
+        atomic_copy(src_path, local_dest)
         logger.info(f"Download (Copy): {src_path} -> {local_dest}")
 
+    def path(self, remote_path: str) -> str:
+        """Caminho absoluto do objeto no 'bucket' local, para leitura direta (sem cópia)."""
+        return os.path.join(self.base_path, remote_path)
+
+    def exists(self, remote_path: str) -> bool:
+        return os.path.exists(os.path.join(self.base_path, remote_path))
+
     def list(self, directory: str = ""):
         """Lista arquivos no diretório relativo do storage."""
         target_dir = os.path.join(self.base_path, directory)
@@ -40,3 +62,185 @@ class LocalStorage:
             for dp, dn, filenames in os.walk(target_dir)
             for f in filenames
         ]
+
+
+class ArtifactStore:
+    """
+    Storage endereçado por conteúdo sobre o LocalStorage.
+
+    No 'bucket':
+      blobs/sha256/<ab>/<hash>           conteúdo imutável de cada arquivo
+      manifests/<artefato>/<versão>.json arquivos da versão (nome -> sha256, tamanho)
+      refs/<artefato>                    versão atual
+
+    A versão é derivada do conteúdo, então builds idênticos geram a mesma versão e
+    arquivos iguais entre versões são gravados uma única vez. No checkout, só os blobs
+    que ainda não estão no cache local são baixados (e conferidos pelo sha256).
+    A ref só muda depois que todos os blobs e o manifest estão gravados.
+    """
+    def __init__(self, storage: LocalStorage, cache_dir: str):
+        self.storage = storage
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def _blob_path(sha256: str) -> str:
+        return f"blobs/sha256/{sha256[:2]}/{sha256}"
+
+    def publish(self, local_dir: str, artifact: str, metadata: dict = None) -> str:
+        """Envia os blobs que faltam, grava o manifest e aponta a ref para a nova versão."""
+        files = {}
+        uploaded = 0
+        for name in sorted(os.listdir(local_dir)):
+            path = os.path.join(local_dir, name)
+            if not os.path.isfile(path):
+                continue
+            sha256 = file_sha256(path)
+            files[name] = {"sha256": sha256, "size": os.path.getsize(path)}
+
+            if not self.storage.exists(self._blob_path(sha256)):
+                self.storage.upload(path, self._blob_path(sha256))
+                uploaded += files[name]["size"]
+
+        version = hashlib.sha256(json.dumps(files, sort_keys=True).encode()).hexdigest()[:16]
+        manifest = {
+            "artifact": artifact,
+            "version": version,
+            "created_at": time.time(),
+            "metadata": metadata or {},
+            "files": files,
+        }
+
+        manifest_tmp = os.path.join(self.cache_dir, f".manifest-{os.getpid()}.json")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(manifest_tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        self.storage.upload(manifest_tmp, f"manifests/{artifact}/{version}.json")
+
+        with open(manifest_tmp, "w") as f:
+            f.write(version)
+        self.storage.upload(manifest_tmp, f"refs/{artifact}")
+        os.remove(manifest_tmp)
+
+        total = sum(info["size"] for info in files.values())
+        logger.info(f"Publicado {artifact}@{version}: {uploaded}/{total} bytes novos")
+        return version
+
+    def current_version(self, artifact: str):
+        ref = f"refs/{artifact}"
+        if not self.storage.exists(ref):
+            return None
+        with open(self.storage.path(ref), "r") as f:
+            return f.read().strip()
+
+    def manifest(self, artifact: str, version: str = None) -> dict:
+        version = version or self.current_version(artifact)
+        if version is None:
+            raise FileNotFoundError(f"Artefato {artifact} não publicado no storage")
+        with open(self.storage.path(f"manifests/{artifact}/{version}.json"), "r") as f:
+            return json.load(f)
+
+    def versions(self, artifact: str) -> list[str]:
+        return sorted(
+            os.path.basename(path).replace(".json", "")
+            for path in self.storage.list(f"manifests/{artifact}")
+        )
+
+    def is_complete(self, artifact: str, version: str = None) -> bool:
+        """Confere se todos os blobs da versão existem no storage com o tamanho esperado."""
+        try:
+            manifest = self.manifest(artifact, version)
+        except FileNotFoundError:
+            return False
+        return all(
+            self.storage.exists(self._blob_path(info["sha256"]))
+            and os.path.getsize(self.storage.path(self._blob_path(info["sha256"]))) == info["size"]
+            for info in manifest["files"].values()
+        )
+
+    def _fetch_blob(self, sha256: str, size: int) -> str:
+        """Garante o blob no cache local, baixando e verificando só se ainda não estiver lá."""
+        local_blob = os.path.join(self.cache_dir, self._blob_path(sha256))
+        if os.path.exists(local_blob) and os.path.getsize(local_blob) == size:
+            return local_blob
+
+        os.makedirs(os.path.dirname(local_blob), exist_ok=True)
+        tmp_path = f"{local_blob}.download-{os.getpid()}"
+        self.storage.download(self._blob_path(sha256), tmp_path)
+
+        if file_sha256(tmp_path) != sha256:
+            os.remove(tmp_path)
+            raise IOError(f"Checksum inválido para o blob {sha256}")
+
+        os.chmod(tmp_path, 0o444) # NOTE: blobs são imutáveis; os checkouts são hardlinks para eles
+        os.replace(tmp_path, local_blob)
+        return local_blob
+
+    def checkout(self, artifact: str, dest_root: str, version: str = None) -> tuple[str, dict]:
+        """
+        Materializa a versão em `dest_root/<versão>` com hardlinks para o cache de blobs
+        (cópia só se estiverem em filesystems diferentes). Retorna (diretório, manifest).
+        """
+        manifest = self.manifest(artifact, version)
+        version_dir = os.path.join(dest_root, manifest["version"])
+        marker = os.path.join(version_dir, ".complete")
+        if os.path.exists(marker):
+            return version_dir, manifest
+        if os.path.exists(version_dir):
+            shutil.rmtree(version_dir)
+
+        tmp_dir = f"{version_dir}.tmp-{os.getpid()}"
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+
+        try:
+            for name, info in manifest["files"].items():
+                blob = self._fetch_blob(info["sha256"], info["size"])
+                target = os.path.join(tmp_dir, name)
+                try:
+                    os.link(blob, target)
+                except FileNotFoundError:
+                    # NOTE: um prune_cache concorrente apagou o blob entre o fetch e o link
+                    os.link(self._fetch_blob(info["sha256"], info["size"]), target)
+                except OSError:
+                    shutil.copy2(blob, target)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        with open(os.path.join(tmp_dir, ".complete"), "w") as f:
+            f.write(manifest["version"])
+
+        try:
+            os.rename(tmp_dir, version_dir)
+        except OSError:
+            # NOTE: outro processo concluiu o mesmo checkout antes
+            shutil.rmtree(tmp_dir)
+            if not os.path.exists(marker):
+                raise
+
+        logger.info(f"Checkout de {artifact}@{manifest['version']} em {version_dir}")
+        return version_dir, manifest
+
+    def prune_cache(self) -> int:
+        """
+        Apaga do cache local os blobs que nenhum checkout usa mais (st_nlink == 1: só o cache
+        aponta para eles). Checkouts copiados (outro filesystem) não seguram o blob; ele volta
+        a ser baixado se uma versão precisar. Retorna os bytes liberados.
+        """
+        freed = 0
+        for root, _, names in os.walk(os.path.join(self.cache_dir, "blobs")):
+            for name in names:
+                if ".download-" in name:
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    if stat.st_nlink == 1:
+                        os.remove(path)
+                        freed += stat.st_size
+                except FileNotFoundError:
+                    continue
+        if freed:
+            logger.info(f"Cache de blobs em {self.cache_dir}: {freed / 2**20:.1f}MB liberados")
+        return freed
@@ -1,81 +1,136 @@
+import time
+import inspect
 import functools
 import logging
-from opentelemetry import trace
-from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.instrumentation.redis import RedisInstrumentor
+
+from src.utils.config import settings
+from src.utils.metrics import metrics
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("compound_ai")
 
 class Telemetry:
+    """
+    Tracing do OpenTelemetry, configurado sob demanda (setup) e não no import: os pacotes
+    do OpenTelemetry só são importados se houver exporter (OTEL_TRACES_EXPORTER != "none").
+    Exporters: "otlp" (Jaeger/collector em OTEL_EXPORTER_ENDPOINT), "file" (JSON por linha
+    em OTEL_TRACES_FILE), "console" ou "none" (sem spans; as métricas continuam).
+    """
     _instance = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Telemetry, cls).__new__(cls)
-            cls._instance._setup()
+            cls._instance.enabled = False
+            cls._instance.tracer = None
+            cls._instance.sample_ratio = 0.0
+            cls._instance._trace = None
         return cls._instance
 
-    def _setup(self):
+    def _exporter(self, kind: str):
+        if kind == "otlp":
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+            return OTLPSpanExporter(endpoint=settings.OTEL_EXPORTER_ENDPOINT, insecure=True)
+        if kind in ("file", "console"):
+            import sys
+            from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+            out = open(settings.OTEL_TRACES_FILE, "a") if kind == "file" else sys.stdout
+            return ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+        raise ValueError(f"Exporter de traces desconhecido: {kind}")
+
+    def setup(self):
+        """Idempotente. Sem exporter ou com amostragem 0, nada do OpenTelemetry é importado."""
+        if self.enabled:
+            return
+        kind = settings.OTEL_TRACES_EXPORTER
+        if kind == "none" or settings.OTEL_SAMPLE_RATIO <= 0:
+            return
+
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.instrumentation.redis import RedisInstrumentor
+
         resource = Resource(attributes={
             "service.name": "compound-ai",
             "service.version": "0.1.0"
         })
 
-        trace.set_tracer_provider(TracerProvider(resource=resource))
- 
-        otlp_exporter = OTLPSpanExporter(endpoint="http://jaeger:4317", insecure=True)
-
+        # NOTE: amostragem por trace (a decisão da raiz vale para os filhos); 1.0 grava tudo
+        self.sample_ratio = settings.OTEL_SAMPLE_RATIO
+        sampler = ParentBased(TraceIdRatioBased(self.sample_ratio))
+        trace.set_tracer_provider(TracerProvider(resource=resource, sampler=sampler))
         trace.get_tracer_provider().add_span_processor(
-            BatchSpanProcessor(otlp_exporter)
+            BatchSpanProcessor(self._exporter(kind))
         )
-        
+
+        self._trace = trace
         self.tracer = trace.get_tracer("compound.ai.tracer")
+        self.enabled = True
 
         RedisInstrumentor().instrument()
+        logger.info(f"Tracing habilitado: exporter {kind}, amostragem {self.sample_ratio}")
 
     def instrument_app(self, app):
-        """Chamado no main.py para instrumentar o FastAPI"""
-        FastAPIInstrumentor.instrument_app(app, tracer_provider=trace.get_tracer_provider())
+        """Chamado na create_app para instrumentar o FastAPI (no-op sem tracing)"""
+        if not self.enabled:
+            return
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+        FastAPIInstrumentor.instrument_app(app, tracer_provider=self._trace.get_tracer_provider())
 
 telemetry = Telemetry()
 
+def _skip_span() -> bool:
+    """Sem span quando o tracing está desligado ou o trace atual não foi amostrado."""
+    if not telemetry.enabled:
+        return True
+    context = telemetry._trace.get_current_span().get_span_context()
+    return context.is_valid and not context.trace_flags.sampled
+
 def instrument(name=None):
     """
     Use @instrument() em cima de qualquer função para medir seu tempo e sucesso/erro automaticamente.
+    O tempo vai sempre para o histograma `span.<nome>_ms`; o span só é criado se o trace for amostrado.
     """
     def decorator(func):
+        span_name = name or func.__name__
+        histogram = metrics.histogram(f"span.{span_name}_ms")
+
         @functools.wraps(func)
         async def async_wrapper(*args, **kwargs):
-            span_name = name or func.__name__
-            with telemetry.tracer.start_as_current_span(span_name) as span:
-                try:
+            start = time.perf_counter()
+            try:
+                if _skip_span():
                     return await func(*args, **kwargs)
-                except Exception as e:
-                    span.record_exception(e)
-                    span.set_status(trace.Status(trace.StatusCode.ERROR))
-                    raise e
+                with telemetry.tracer.start_as_current_span(span_name) as span:
+                    try:
+                        return await func(*args, **kwargs)
+                    except Exception as e:
+                        span.record_exception(e)
+                        span.set_status(telemetry._trace.Status(telemetry._trace.StatusCode.ERROR))
+                        raise e
+            finally:
+                histogram.observe((time.perf_counter() - start) * 1000)
 
         @functools.wraps(func)
         def sync_wrapper(*args, **kwargs):
-            span_name = name or func.__name__
-            with telemetry.tracer.start_as_current_span(span_name) as span:
-                try:
+            start = time.perf_counter()
+            try:
+                if _skip_span():
                     return func(*args, **kwargs)
-                except Exception as e:
-                    span.record_exception(e)
-                    span.set_status(trace.Status(trace.StatusCode.ERROR))
-                    raise e
-
-        if logging.getLogger().level == logging.DEBUG:
-            pass
-            
-        import inspect
+                with telemetry.tracer.start_as_current_span(span_name) as span:
+                    try:
+                        return func(*args, **kwargs)
+                    except Exception as e:
+                        span.record_exception(e)
+                        span.set_status(telemetry._trace.Status(telemetry._trace.StatusCode.ERROR))
+                        raise e
+            finally:
+                histogram.observe((time.perf_counter() - start) * 1000)
+
         if inspect.iscoroutinefunction(func):
             return async_wrapper
         return sync_wrapper
-    return decorator
\ No newline at end of file
+    return decorator
@@ -0,0 +1,8 @@
+import re
+import unicodedata
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, NFKC, sem pontuação e com espaços colapsados (mantém acentos)."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())